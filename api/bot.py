@@ -1,11 +1,32 @@
 import json
 import os
 import sys
+import threading
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from http.server import BaseHTTPRequestHandler
-from bot.telegram_bot import process_webhook_update
+from urllib.parse import urlparse
+from rag.global_rag import startup_timings, startup_status, warmup
+
+# The RAG pipeline itself is built lazily on the first question or /warmup
+with startup_timings.measure("imports"):
+    from bot.ingress import ThreadedIngress, QUEUED, DUPLICATE, REJECTED, FAILED
+    from bot.telegram_bot import process_webhook_update
+    from rag.config import WEBHOOK_SYNC_WAIT
+
+_ingress = None
+_ingress_lock = threading.Lock()
+
+
+def get_ingress():
+    # One event loop per instance, so the bot's HTTP session and queued work
+    # survive between invocations
+    global _ingress
+    with _ingress_lock:
+        if _ingress is None:
+            _ingress = ThreadedIngress(process_webhook_update)
+    return _ingress
 
 
 class handler(BaseHTTPRequestHandler):
@@ -15,12 +36,16 @@ class handler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             update = json.loads(post_data)
 
-            response = process_webhook_update(update)
+            result = get_ingress().submit(update, wait=WEBHOOK_SYNC_WAIT)
 
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+            if result == REJECTED:
+                self._send_json(503, {"status": "busy"})
+            elif result == FAILED:
+                self._send_json(500, {"status": result})
+            elif result not in (QUEUED, DUPLICATE):
+                self._send_json(400, {"status": result})
+            else:
+                self._send_json(200, {"status": result})
 
         except Exception as e:
             print(f"Error in webhook: {e}")
@@ -28,10 +53,30 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
 
     def do_GET(self):
+        path = urlparse(self.path).path.rstrip('/')
+
+        if path.endswith('/warmup'):
+            try:
+                self._send_json(200, {"status": "ok", **warmup()})
+            except Exception as e:
+                print(f"Error in warmup: {e}")
+                self._send_json(500, {"status": "error", "message": str(e), **startup_status()})
+            return
+
+        if path.endswith('/health'):
+            self._send_json(200, {"status": "ok", **startup_status()})
+            return
+
         self.send_response(200)
         self.send_header('Content-type', 'text/plain')
         self.end_headers()
         self.wfile.write(b"Bot is running on Vercel!")
 
+    def _send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
     def log_message(self, format, *args):
         pass
\ No newline at end of file
@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+
+
+def flatten(results):
+    # {"ingest.small.embed_chunks_per_s": 812.3, "query.total.p95_ms": 61.2, ...}
+    metrics = {}
+    for section in ("ingest", "query", "memory"):
+        for key, value in results.get(section, {}).items():
+            if isinstance(value, dict):
+                for name, number in value.items():
+                    metrics[f"{section}.{key}.{name}"] = number
+            else:
+                metrics[f"{section}.{key}"] = value
+    return metrics
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_s")
+
+
+def is_compared(metric):
+    return higher_is_better(metric) or metric.endswith("_ms") or metric.endswith("_mb")
+
+
+def compare(baseline, current, tolerance):
+    # Returns [(metric, baseline, current, relative change, regressed)]
+    rows = []
+    base_metrics, current_metrics = flatten(baseline), flatten(current)
+    for metric, before in base_metrics.items():
+        after = current_metrics.get(metric)
+        if not is_compared(metric) or not before or after is None:
+            continue
+        change = (after - before) / before
+        regressed = change < -tolerance if higher_is_better(metric) else change > tolerance
+        rows.append((metric, before, after, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    for key in ("embedder", "backend", "ingest_workers", "ingest_batch_size", "gemini_latency"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"Warning: {key} differs ({baseline['meta'].get(key)} vs {current['meta'].get(key)})")
+
+    rows = compare(baseline, current, args.tolerance)
+    width = max((len(row[0]) for row in rows), default=0)
+    for metric, before, after, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{metric:<{width}}  {before:>10}  {after:>10}  {change:+7.1%}  {flag}")
+
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import random
+
+import pymupdf
+
+# Words and API names that look like the pandas docs, so BM25 and the
+# hashing embedder have something to match on
+VOCABULARY = (
+    "pandas dataframe series index column row merge join concat groupby aggregate apply "
+    "pivot_table melt stack unstack read_csv to_csv read_parquet dtype astype fillna dropna "
+    "isna loc iloc at iat resample rolling window datetime timedelta categorical sort_values "
+    "value_counts describe head tail query eval sum mean median min max count "
+    "DataFrame.merge DataFrame.groupby Series.str.contains pd.to_datetime DataFrame.pivot_table"
+).split()
+FILLER = "the a of to and in is for with by on returns parameter default example".split()
+
+PAGE_WORDS = 450
+PDF_SIZES = {"small": 10, "medium": 100, "large": 400}
+
+
+def _sentence(rnd, vocabulary=VOCABULARY):
+    words = [rnd.choice(vocabulary if rnd.random() < 0.4 else FILLER) for _ in range(rnd.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_pdf(path, pages, seed=0, words_per_page=PAGE_WORDS, vocabulary=VOCABULARY):
+    rnd = random.Random(seed)
+    doc = pymupdf.open()
+    try:
+        for page_num in range(pages):
+            lines = []
+            words = 0
+            while words < words_per_page:
+                sentence = _sentence(rnd, vocabulary)
+                lines.append(sentence)
+                words += sentence.count(" ") + 1
+            page = doc.new_page()
+            page.insert_textbox(pymupdf.Rect(36, 36, 576, 806), " ".join(lines), fontsize=7)
+        doc.save(path)
+    finally:
+        doc.close()
+    return path
+
+
+def make_fixture_pdfs(directory, sizes=PDF_SIZES, seed=0):
+    # {name: path}; files are reused between runs with the same sizes
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for i, (name, pages) in enumerate(sizes.items()):
+        path = os.path.join(directory, f"{name}_{pages}p.pdf")
+        if not os.path.exists(path):
+            make_pdf(path, pages, seed=seed + i)
+        paths[name] = path
+    return paths
+
+
+def make_topic_pdfs(directory, n_documents, pages, topic_words=6, seed=0):
+    # Each PDF draws its terms from its own slice of the vocabulary, so
+    # documents differ the way separate manuals do
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(n_documents):
+        path = os.path.join(directory, f"topic{i:03d}_{pages}p.pdf")
+        if not os.path.exists(path):
+            vocabulary = random.Random(seed + i).sample(VOCABULARY, topic_words)
+            make_pdf(path, pages, seed=seed + i, vocabulary=vocabulary)
+        paths.append(path)
+    return paths
+
+
+def make_questions(n, seed=0):
+    rnd = random.Random(seed)
+    templates = [
+        "How do I use {} with {}?",
+        "What does {} return when {} is missing?",
+        "Difference between {} and {}",
+        "{} {} example",
+    ]
+    return [rnd.choice(templates).format(rnd.choice(VOCABULARY), rnd.choice(VOCABULARY)) for _ in range(n)]
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+
+from benchmarks.fixtures import make_questions
+from benchmarks.gemini_stub_server import StubGemini, start_server
+from benchmarks.run import percentiles
+
+# Answer latency and error rate of the Gemini call policy against the local stub
+# server, from a bare single attempt up to retries + hedging + model fallback.
+# Uses the real google-genai client over HTTP, so timeouts and errors take the same path as in production.
+
+POLICIES = {
+    "single": {"max_attempts": 1, "hedge": False, "fallback": False},
+    "retries": {"hedge": False, "fallback": False},
+    "hedged": {"fallback": False},
+    "fallback": {},
+}
+
+
+def make_client(policy, base_url, args):
+    from google import genai
+
+    from rag.gemini_client import GeminiClient
+
+    settings = dict(POLICIES[policy])
+    models = [args.model, args.fallback_model] if settings.pop("fallback", True) else [args.model]
+    client = genai.Client(api_key="stub", http_options={"base_url": base_url})
+    return GeminiClient(
+        lambda: client, models=models, deadline=args.deadline, attempt_timeout=args.attempt_timeout, **settings
+    )
+
+
+async def bench_policy(policy, args):
+    from rag.gemini_client import GeminiUnavailable
+
+    # Same seed per policy, so every policy faces the same sequence of slow and failing responses
+    stub = StubGemini(json.loads(args.behaviour), json.loads(args.models), seed=args.seed)
+    runner, base_url = await start_server(stub)
+    gemini = make_client(policy, base_url, args)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def ask(question):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await gemini.generate([question])
+            except GeminiUnavailable:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*(ask(q) for q in make_questions(args.requests)))
+    finally:
+        await runner.cleanup()
+
+    upstream = sum(stub.stats.values())
+    return {
+        **percentiles(latencies),
+        "error_rate": round(errors / args.requests, 3),
+        "upstream_per_request": round(upstream / args.requests, 2),
+        "upstream": dict(stub.stats),
+    }
+
+
+def run(args):
+    results = {}
+    output = sys.stdout if args.verbose else io.StringIO()
+    for policy in args.policies.split(","):
+        with contextlib.redirect_stdout(output):
+            results[policy] = asyncio.run(bench_policy(policy, args))
+        stats = results[policy]
+        print(
+            f"{policy}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, "
+            f"errors {stats['error_rate']:.1%}, {stats['upstream_per_request']} upstream calls/request"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini call policies against a stub with slow and failing responses")
+    parser.add_argument("--policies", default=",".join(POLICIES))
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--deadline", type=float, default=10.0)
+    parser.add_argument("--attempt-timeout", type=float, default=4.0)
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--fallback-model", default="gemini-2.5-flash-lite")
+    parser.add_argument("--behaviour", default='{"error_rate": 0.1, "slow_rate": 0.05, "hang_rate": 0.01}',
+                        help="stub behaviour for every model, JSON (see gemini_stub_server.DEFAULT_BEHAVIOUR)")
+    parser.add_argument("--models", default='{"gemini-2.5-flash-lite": {"latency": 0.4, "error_rate": 0.02}}',
+                        help="per-model behaviour overrides, JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="gemini_slo_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show per-attempt client output")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
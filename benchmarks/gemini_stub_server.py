@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+
+from aiohttp import web
+
+# Local stand-in for the Gemini REST API (generateContent / streamGenerateContent)
+# with configurable latency, slow tails, errors and hung requests. Point the bot at
+# it with GEMINI_BASE_URL=http://127.0.0.1:8765
+
+ERROR_STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+ANSWER = "Use DataFrame.merge(left, right, on='key') to join two frames on a column. "
+
+DEFAULT_BEHAVIOUR = {
+    "latency": 0.8,        # seconds, normal distribution
+    "jitter": 0.2,
+    "slow_rate": 0.05,     # share of requests that take slow_latency instead
+    "slow_latency": 8.0,
+    "error_rate": 0.0,     # share answered with error_status
+    "error_status": 503,
+    "hang_rate": 0.0,      # share that never answer
+    "stream_chunks": 8,
+}
+
+
+class StubGemini:
+    def __init__(self, behaviour=None, models=None, seed=0, answer_chars=800):
+        # behaviour applies to every model; models: {name: overrides}
+        self.behaviour = {**DEFAULT_BEHAVIOUR, **(behaviour or {})}
+        self.models = models or {}
+        self.answer = (ANSWER * 20)[:answer_chars]
+        self.random = random.Random(seed)
+        self.stats = Counter()
+
+    def _behaviour(self, model):
+        return {**self.behaviour, **self.models.get(model, {})}
+
+    def _plan(self, model):
+        # (outcome, seconds before answering)
+        b = self._behaviour(model)
+        roll = self.random.random()
+        if roll < b["hang_rate"]:
+            return "hang", 3600
+        if roll < b["hang_rate"] + b["error_rate"]:
+            return "error", max(0.0, self.random.gauss(b["latency"] / 4, b["jitter"] / 4))
+        if roll < b["hang_rate"] + b["error_rate"] + b["slow_rate"]:
+            return "slow", b["slow_latency"]
+        return "ok", max(0.0, self.random.gauss(b["latency"], b["jitter"]))
+
+    def _body(self, model, text, final=True):
+        body = {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}],
+            "modelVersion": model,
+        }
+        if final:
+            body["candidates"][0]["finishReason"] = "STOP"
+            body["usageMetadata"] = {
+                "promptTokenCount": 900,
+                "candidatesTokenCount": len(self.answer) // 4,
+                "totalTokenCount": 900 + len(self.answer) // 4,
+            }
+        return body
+
+    def _error(self, model):
+        status = self._behaviour(model)["error_status"]
+        return web.json_response({"error": {
+            "code": status,
+            "message": f"Stubbed {status} from {model}",
+            "status": ERROR_STATUS_NAMES.get(status, "UNKNOWN"),
+        }}, status=status)
+
+    async def handle(self, request):
+        # /{version}/models/{model}:{method}
+        model, _, method = request.match_info["target"].partition(":")
+        await request.read()
+        outcome, delay = self._plan(model)
+        self.stats[f"{model} {method} {outcome}"] += 1
+
+        if method == "streamGenerateContent":
+            return await self._stream(request, model, outcome, delay)
+        await asyncio.sleep(delay)
+        if outcome == "error":
+            return self._error(model)
+        return web.json_response(self._body(model, self.answer))
+
+    async def _stream(self, request, model, outcome, delay):
+        chunks = self._behaviour(model)["stream_chunks"]
+        # Time to the first chunk is a quarter of the answer time, the rest is spread over the chunks
+        await asyncio.sleep(delay / 4)
+        if outcome == "error":
+            return self._error(model)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        size = -(-len(self.answer) // chunks)
+        for i in range(0, len(self.answer), size):
+            if i:
+                await asyncio.sleep(3 * delay / 4 / chunks)
+            final = i + size >= len(self.answer)
+            payload = json.dumps(self._body(model, self.answer[i:i + size], final))
+            await response.write(f"data: {payload}\r\n\r\n".encode())
+        await response.write_eof()
+        return response
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/{version}/models/{target}", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+async def start_server(stub, host="127.0.0.1", port=0):
+    # Returns (runner, base_url); port 0 picks a free port. Handlers of requests the
+    # client gave up on are cancelled, so hung requests don't hold up cleanup()
+    runner = web.AppRunner(stub.make_app(), handler_cancellation=True, shutdown_timeout=1)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini API stub with slow and failing responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for key, value in DEFAULT_BEHAVIOUR.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--models", default="{}", help='per-model overrides as JSON, e.g. {"gemini-2.5-flash": {"error_rate": 0.3}}')
+    args = parser.parse_args()
+
+    behaviour = {key: getattr(args, key) for key in DEFAULT_BEHAVIOUR}
+    stub = StubGemini(behaviour, json.loads(args.models))
+    print(f"Gemini stub on http://{args.host}:{args.port} ({behaviour})")
+    web.run_app(stub.make_app(), host=args.host, port=args.port, print=None, handler_cancellation=True)
+
+
+if __name__ == "__main__":
+    main()
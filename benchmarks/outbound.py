@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import time
+
+from benchmarks.run import percentiles
+from benchmarks.telegram_stub_server import StubTelegram, start_server
+
+# Reply delivery under a burst of questions against the local Bot API stub:
+# "direct" is the old handler (placeholder, then the answer as new messages, a
+# 429 loses the reply), "queued" goes through bot/outbound.py.
+
+PLACEHOLDER = "Searching the answer..."
+
+
+def make_workload(args):
+    # [(chat id, arrival offset, answer seconds, answer text)]
+    rng = random.Random(args.seed)
+    workload = []
+    for i in range(args.chats):
+        chat_id = -(1000 + i) if rng.random() < args.group_share else 1000 + i
+        for _ in range(args.questions):
+            length = args.long_answer if rng.random() < args.long_share else args.answer
+            answer = ("Use DataFrame.merge(left, right, on='key') to join two frames. " * 100)[:length]
+            workload.append((chat_id, rng.uniform(0, args.spread), rng.uniform(*args.answer_seconds), answer))
+    return workload
+
+
+async def reply_direct(message, answer_seconds, answer):
+    from bot.outbound import split_message
+
+    await message.answer(PLACEHOLDER)
+    await asyncio.sleep(answer_seconds)
+    for part in split_message(answer):
+        await message.answer(part)
+
+
+async def reply_queued(message, answer_seconds, answer, placeholder_delay):
+    from bot.outbound import Reply
+
+    async with Reply(message, PLACEHOLDER, delay=placeholder_delay) as reply:
+        await asyncio.sleep(answer_seconds)
+        await reply.finish(answer)
+
+
+async def bench_mode(mode, workload, args):
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Chat, Message
+
+    stub = StubTelegram(seed=args.seed)
+    runner, base_url = await start_server(stub)
+    bot = Bot("123456:stub", session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+    if mode == "queued":
+        # The shared instance: Reply checks it before sending optional messages
+        from bot.outbound import outbound
+
+        bot.session.middleware(outbound)
+
+    latencies, dropped = [], 0
+
+    async def ask(number, chat_id, arrival, answer_seconds, answer):
+        nonlocal dropped
+        await asyncio.sleep(arrival)
+        chat = Chat(id=chat_id, type="supergroup" if chat_id < 0 else "private")
+        message = Message(message_id=number, date=datetime.datetime.now(), chat=chat, text="question").as_(bot)
+        ready = time.perf_counter() + answer_seconds
+        try:
+            if mode == "queued":
+                await reply_queued(message, answer_seconds, answer, args.placeholder_delay)
+            else:
+                await reply_direct(message, answer_seconds, answer)
+        except Exception:
+            dropped += 1
+            return
+        # Time from the answer being ready to its last part being delivered
+        latencies.append(max(0.0, time.perf_counter() - ready))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(ask(i, *question) for i, question in enumerate(workload)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await bot.session.close()
+        await runner.cleanup()
+
+    accepted = len(stub.delivered)
+    rejected = sum(count for key, count in stub.stats.items() if key.endswith("429"))
+    return {
+        "replies": len(workload),
+        "dropped": dropped,
+        **(percentiles(latencies) if latencies else {}),
+        "api_calls": accepted,
+        "api_calls_per_reply": round(accepted / len(workload), 2),
+        "429_responses": rejected,
+        "calls_per_second": round(accepted / elapsed, 1),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def run(args):
+    workload = make_workload(args)
+    results = {}
+    for mode in args.modes.split(","):
+        results[mode] = asyncio.run(bench_mode(mode, workload, args))
+        stats = results[mode]
+        print(
+            f"{mode}: {stats['replies'] - stats['dropped']}/{stats['replies']} replies delivered, "
+            f"delivery p50 {stats.get('p50_ms')} ms, p95 {stats.get('p95_ms')} ms, p99 {stats.get('p99_ms')} ms, "
+            f"{stats['api_calls_per_reply']} calls/reply, {stats['429_responses']} x 429, "
+            f"{stats['calls_per_second']} calls/s"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telegram reply delivery under a burst, against a fake Bot API")
+    parser.add_argument("--modes", default="direct,queued")
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=2, help="questions per chat")
+    parser.add_argument("--group-share", type=float, default=0.1, help="share of chats that are groups")
+    parser.add_argument("--spread", type=float, default=10.0, help="questions arrive within this many seconds")
+    parser.add_argument("--answer-seconds", type=float, nargs=2, default=(0.3, 4.0), help="answer time range")
+    parser.add_argument("--answer", type=int, default=800, help="answer length in characters")
+    parser.add_argument("--long-answer", type=int, default=6000, help="length of long (split) answers")
+    parser.add_argument("--long-share", type=float, default=0.1)
+    parser.add_argument("--placeholder-delay", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="outbound_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show RetryAfter warnings")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import make_topic_pdfs, make_questions
+from benchmarks.run import FIXTURES_DIR, make_pipeline
+from benchmarks.stubs import HashingEmbeddings, StubGeminiClient
+
+
+def parse_setting(setting):
+    # "int8:4" -> ("int8", None, 4), "pq48:0" -> ("pq", 48, 0)
+    name, _, rerank = setting.partition(":")
+    rerank = int(rerank) if rerank else 4
+    if name == "int8":
+        return "int8", None, rerank
+    if name.startswith("pq"):
+        return "pq", int(name[2:]), rerank
+    raise ValueError(f"Unknown setting: {setting}")
+
+
+def bench_setting(reference, setting, queries, k, work_dir):
+    from rag.config import PQ_SUBVECTORS
+    from rag.vector_index import QuantizedIndex, copy_index, recall_at_k
+
+    mode, subvectors, rerank = parse_setting(setting)
+    started = time.perf_counter()
+    # Trained once every vector is in, like an index that has passed QUANT_TRAIN_SIZE
+    index = QuantizedIndex(
+        os.path.join(work_dir, setting.replace(":", "_")), mode=mode,
+        subvectors=subvectors or PQ_SUBVECTORS, rerank=rerank, train_size=reference.count(),
+    )
+    copy_index(reference, index)
+    build_seconds = time.perf_counter() - started
+
+    recall, reference_ms, ms = recall_at_k(reference, index, queries, k)
+    flat_bytes = reference.dim * 4 + 5
+    return {
+        "bytes_per_chunk": index.bytes_per_chunk(),
+        "compression": round(flat_bytes / index.bytes_per_chunk(), 1),
+        f"recall@{k}": round(recall, 3),
+        "ms_per_query": round(ms, 3),
+        "flat_ms_per_query": round(reference_ms, 3),
+        "build_seconds": round(build_seconds, 2),
+    }
+
+
+def run(args):
+    pdfs = make_topic_pdfs(args.fixtures, args.documents, args.pages)
+    if args.embedder == "minilm":
+        from rag.embedding_engine import EmbeddingEngine
+
+        embedder = EmbeddingEngine()
+    else:
+        embedder = HashingEmbeddings()
+    queries = np.asarray(embedder.embed_documents(make_questions(args.queries)), dtype=np.float32)
+
+    results = {}
+    output = sys.stdout if args.verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(output):
+        from rag.manifest import file_sha256
+
+        # The uncompressed reference: a flat float32 index built by the real ingestion path
+        rag = make_pipeline(work_dir, "flat", embedder, StubGeminiClient(latency=0))
+        rag._index_documents([(file_sha256(path), path) for path in pdfs])
+        reference = rag.vectorstore
+        for setting in args.settings.split(","):
+            results[setting] = bench_setting(reference, setting, queries, args.k, work_dir)
+        chunks, dim = reference.count(), reference.dim
+
+    return {"chunks": chunks, "dim": dim, "float32_bytes_per_chunk": dim * 4 + 5, "settings": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per chunk and recall of quantized indexes vs. flat float32")
+    parser.add_argument("--settings", default="int8:0,int8:4,pq96:0,pq96:4,pq48:0,pq48:4,pq24:4",
+                        help="comma-separated int8[:rerank] / pq<subvectors>[:rerank]")
+    parser.add_argument("--documents", type=int, default=40, help="synthetic PDFs in the corpus")
+    parser.add_argument("--pages", type=int, default=20, help="pages per PDF")
+    parser.add_argument("--embedder", default="fake", choices=["fake", "minilm"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=6)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--output", default="quantization_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"{results['chunks']} chunks, float32: {results['float32_bytes_per_chunk']} bytes/chunk")
+    for setting, stats in results["settings"].items():
+        print(
+            f"{setting}: {stats['bytes_per_chunk']} bytes/chunk ({stats['compression']}x), "
+            f"recall@{args.k} {stats[f'recall@{args.k}']}, {stats['ms_per_query']} ms/query "
+            f"(flat {stats['flat_ms_per_query']} ms), built in {stats['build_seconds']}s"
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
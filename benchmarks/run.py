@@ -0,0 +1,205 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import PDF_SIZES, make_fixture_pdfs, make_questions
+from benchmarks.stubs import HashingEmbeddings, StubGeminiClient
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures_cache")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children covers the parsing workers
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(self_rss, 1), round(children_rss, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(ms, p)), 2) for p in (50, 95, 99)}
+
+
+def make_pipeline(work_dir, backend, embedder, gemini):
+    # A real RAGPipeline wired to a scratch index, the chosen embedder and the stub Gemini client
+    from rag import rag_pipeline
+    from rag.bm25_index import BM25Index
+    from rag.manifest import DocumentManifest
+    from rag.routing import RoutingIndex
+    from rag.vector_index import create_vector_index
+
+    rag_pipeline._client = gemini
+    rag = rag_pipeline.RAGPipeline()
+    rag._embedding = embedder
+    rag.vectorstore = create_vector_index(backend, path=os.path.join(work_dir, backend))
+    rag.bm25 = BM25Index(os.path.join(work_dir, "bm25.pkl"))
+    rag.routing = RoutingIndex(os.path.join(work_dir, "routing.pkl"))
+    rag.manifest = DocumentManifest(os.path.join(work_dir, "manifest.json"))
+    # Every query should pay for the full path
+    rag.answer_cache = None
+    rag._loaded = True
+    return rag
+
+
+def rate(stage, timings):
+    seconds, items = timings.stages.get(stage, (0.0, 0))
+    return round(items / seconds, 1) if seconds else None
+
+
+def bench_ingest(rag, pdfs):
+    from rag.manifest import file_sha256
+    from rag.timing import StageTimings
+
+    results = {}
+    for name, path in pdfs.items():
+        timings = StageTimings()
+        started = time.perf_counter()
+        rag._index_documents([(file_sha256(path), path)], timings=timings)
+        wall = time.perf_counter() - started
+
+        pages = timings.stages.get("parse", (0, 0))[1]
+        chunks = timings.stages.get("embed", (0, 0))[1]
+        results[name] = {
+            "pages": pages,
+            "chunks": chunks,
+            "wall_seconds": round(wall, 3),
+            "pages_per_s": round(pages / wall, 1) if wall else None,
+            # Parse time is summed over workers when parsing in parallel
+            "parse_pages_per_s": rate("parse", timings),
+            "embed_chunks_per_s": rate("embed", timings),
+            "write_chunks_per_s": rate("write", timings),
+        }
+    return results
+
+
+def bench_queries(rag, questions):
+    from rag.rag_pipeline import ask_gemini
+
+    stages = {"embed": [], "search": [], "generate": [], "total": []}
+    for question in questions:
+        started = time.perf_counter()
+        vector = rag.embedding.embed_query(question)
+        embedded = time.perf_counter()
+        context = rag.retrieve_context(question, vector)
+        searched = time.perf_counter()
+        ask_gemini(question, context)
+        generated = time.perf_counter()
+
+        stages["embed"].append(embedded - started)
+        stages["search"].append(searched - embedded)
+        stages["generate"].append(generated - searched)
+        stages["total"].append(generated - started)
+
+    return {stage: percentiles(seconds) for stage, seconds in stages.items()}
+
+
+def run(args):
+    from rag.config import INGEST_BATCH_SIZE, INGEST_WORKERS
+
+    sizes = {name: PDF_SIZES[name] for name in args.sizes.split(",")}
+    pdfs = make_fixture_pdfs(args.fixtures, sizes)
+    questions = make_questions(args.queries)
+
+    if args.embedder == "minilm":
+        from rag.embedding_engine import EmbeddingEngine
+
+        # The bare engine: cache hits would hide the model's cost
+        embedder = EmbeddingEngine()
+    else:
+        embedder = HashingEmbeddings()
+    gemini = StubGeminiClient(latency=args.gemini_latency, jitter=args.gemini_jitter)
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(output):
+        rag = make_pipeline(work_dir, args.backend, embedder, gemini)
+        ingest = bench_ingest(rag, pdfs)
+        # Parse workers only count towards RUSAGE_CHILDREN once they have exited
+        from rag.parallel_ingest import shutdown_pool
+
+        shutdown_pool()
+        query = bench_queries(rag, questions)
+        indexed_chunks = rag.vectorstore.count()
+
+    rss, children_rss = peak_rss_mb()
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "embedder": args.embedder,
+            "backend": args.backend,
+            "ingest_workers": INGEST_WORKERS,
+            "ingest_batch_size": INGEST_BATCH_SIZE,
+            "gemini_latency": args.gemini_latency,
+            "queries": len(questions),
+            "indexed_chunks": indexed_chunks,
+        },
+        "ingest": ingest,
+        "query": query,
+        "memory": {"peak_rss_mb": rss, "peak_children_rss_mb": children_rss},
+    }
+
+
+def print_summary(results):
+    for name, stats in results["ingest"].items():
+        print(
+            f"ingest {name}: {stats['pages']} pages, {stats['chunks']} chunks in {stats['wall_seconds']:.2f}s | "
+            f"parse {stats['parse_pages_per_s']} pages/s, embed {stats['embed_chunks_per_s']} chunks/s, "
+            f"write {stats['write_chunks_per_s']} chunks/s"
+        )
+    for stage, stats in results["query"].items():
+        print(f"query {stage}: " + ", ".join(f"{key} {value}" for key, value in stats.items()))
+    memory = results["memory"]
+    print(f"peak RSS: {memory['peak_rss_mb']} MB (parse workers {memory['peak_children_rss_mb']} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and query benchmark")
+    parser.add_argument("--sizes", default="small,medium", help=f"comma-separated from {', '.join(PDF_SIZES)}")
+    parser.add_argument("--embedder", default="fake", choices=["fake", "minilm"])
+    parser.add_argument("--backend", default="flat", choices=["chroma", "flat", "hnsw", "quantized"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="seconds per stubbed Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, help="INGEST_WORKERS for this run")
+    parser.add_argument("--batch-size", type=int, help="INGEST_BATCH_SIZE for this run")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args()
+
+    # rag.config reads these once at import, so set them before anything imports it
+    if args.workers is not None:
+        os.environ["INGEST_WORKERS"] = str(args.workers)
+    if args.batch_size is not None:
+        os.environ["INGEST_BATCH_SIZE"] = str(args.batch_size)
+
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
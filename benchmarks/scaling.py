@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import make_topic_pdfs, make_questions
+from benchmarks.run import FIXTURES_DIR, make_pipeline, percentiles
+from benchmarks.stubs import HashingEmbeddings, StubGeminiClient
+
+
+def bench_search(rag, vectors, k):
+    # Vector search latency and top-k overlap of routed search with a full search
+    timings = {"full": [], "routed": []}
+    overlap = []
+    for vector in vectors:
+        rag.hierarchical = False
+        started = time.perf_counter()
+        full = rag.search(vector, k)
+        timings["full"].append(time.perf_counter() - started)
+
+        rag.hierarchical = True
+        started = time.perf_counter()
+        routed = rag.search(vector, k)
+        timings["routed"].append(time.perf_counter() - started)
+
+        if full:
+            overlap.append(len({d.id for d in full} & {d.id for d in routed}) / len(full))
+
+    results = {mode: percentiles(seconds) for mode, seconds in timings.items()}
+    results["routed_overlap"] = round(sum(overlap) / len(overlap), 3) if overlap else None
+    return results
+
+
+def run(args):
+    from rag.config import RETRIEVAL_CANDIDATES
+    from rag.manifest import file_sha256
+
+    steps = sorted(int(n) for n in args.documents.split(","))
+    pdfs = make_topic_pdfs(args.fixtures, steps[-1], args.pages)
+    embedder = HashingEmbeddings()
+    vectors = [embedder.embed_query(q) for q in make_questions(args.queries)]
+
+    results = {}
+    output = sys.stdout if args.verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(output):
+        rag = make_pipeline(work_dir, args.backend, embedder, StubGeminiClient(latency=0))
+        indexed = 0
+        for step in steps:
+            rag._index_documents([(file_sha256(path), path) for path in pdfs[indexed:step]])
+            indexed = step
+            results[str(step)] = {
+                "chunks": rag.vectorstore.count(),
+                **bench_search(rag, vectors, RETRIEVAL_CANDIDATES),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search latency as the corpus grows, with and without routing")
+    parser.add_argument("--documents", default="1,10,100", help="comma-separated corpus sizes in PDFs")
+    parser.add_argument("--pages", type=int, default=20, help="pages per PDF")
+    parser.add_argument("--backend", default="flat", choices=["chroma", "flat", "hnsw", "quantized"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--output", default="scaling_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for step, stats in results.items():
+        print(
+            f"{step} PDFs ({stats['chunks']} chunks): full p50 {stats['full']['p50_ms']} ms, "
+            f"p95 {stats['full']['p95_ms']} ms | routed p50 {stats['routed']['p50_ms']} ms, "
+            f"p95 {stats['routed']['p95_ms']} ms | overlap {stats['routed_overlap']}"
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+TOKEN_RE = re.compile(r"[a-z0-9_.]+")
+
+
+class HashingEmbeddings(Embeddings):
+    # Deterministic stand-in for MiniLM: hashed bag of words, L2-normalised.
+    # Costs far less than the model, so embed numbers measure the pipeline around it
+    backend = "hashing"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class StubGeminiClient:
+    # Mimics the parts of google-genai the pipeline calls; sleeps instead of calling the API.
+    # Latency is drawn from a normal distribution, streamed answers arrive in `chunks` pieces
+    def __init__(self, latency=0.8, jitter=0.2, answer_chars=800, chunks=8, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.answer = ("Use DataFrame.merge(left, right, on='key'). " * 40)[:answer_chars]
+        self.chunks = chunks
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.models = SimpleNamespace(generate_content=self._generate)
+        self.aio = SimpleNamespace(models=SimpleNamespace(
+            generate_content=self._agenerate,
+            generate_content_stream=self._agenerate_stream,
+        ))
+
+    def _delay(self):
+        self.calls += 1
+        return max(0.0, self._random.gauss(self.latency, self.jitter))
+
+    def _generate(self, model, contents, **kwargs):
+        time.sleep(self._delay())
+        return SimpleNamespace(text=self.answer)
+
+    async def _agenerate(self, model, contents, **kwargs):
+        await asyncio.sleep(self._delay())
+        return SimpleNamespace(text=self.answer)
+
+    async def _agenerate_stream(self, model, contents, **kwargs):
+        delay = self._delay()
+        size = -(-len(self.answer) // self.chunks)
+
+        async def pieces():
+            for i in range(0, len(self.answer), size):
+                await asyncio.sleep(delay / self.chunks)
+                yield SimpleNamespace(text=self.answer[i:i + size])
+
+        return pieces()
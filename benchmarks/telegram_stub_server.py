@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from bot.rate_limit import TokenBucket
+
+# Local stand-in for the Telegram Bot API (sendMessage / editMessageText) that
+# enforces flood limits the way Telegram does: over a chat's or the bot's limit
+# the call fails with 429 and a retry_after. Point aiogram at it with
+# AiohttpSession(api=TelegramAPIServer.from_base("http://127.0.0.1:8081"))
+
+DEFAULT_LIMITS = {
+    "chat_per_second": 1.0,     # private chats, with a short burst allowance
+    "chat_burst": 3,
+    "group_per_minute": 20.0,
+    "global_per_second": 30.0,
+    "latency": 0.05,            # seconds per call
+    "jitter": 0.02,
+}
+
+
+class StubTelegram:
+    def __init__(self, limits=None, seed=0):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.random = random.Random(seed)
+        self.global_bucket = TokenBucket(self.limits["global_per_second"] * 60, int(self.limits["global_per_second"]))
+        self.chats = {}
+        self.next_message_id = 1
+        self.stats = Counter()
+        # (monotonic time, chat id, method) of every accepted call
+        self.delivered = []
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(self.limits["group_per_minute"], self.limits["chat_burst"])
+            else:
+                bucket = TokenBucket(self.limits["chat_per_second"] * 60, self.limits["chat_burst"])
+            self.chats[chat_id] = bucket
+        return bucket
+
+    def _too_many(self, wait):
+        retry_after = max(1, math.ceil(wait))
+        return web.json_response({
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {retry_after}",
+            "parameters": {"retry_after": retry_after},
+        }, status=429)
+
+    def _message(self, chat_id, text, message_id=None):
+        if message_id is None:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+        chat_type = "supergroup" if chat_id < 0 else "private"
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": chat_type},
+            "text": text,
+        }
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = await request.post()
+        await asyncio.sleep(max(0.0, self.random.gauss(self.limits["latency"], self.limits["jitter"])))
+
+        if "chat_id" not in data:
+            self.stats[f"{method} ok"] += 1
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = int(data["chat_id"])
+        bucket = self._chat_bucket(chat_id)
+        if not bucket.try_acquire():
+            self.stats[f"{method} 429"] += 1
+            return self._too_many(bucket.retry_after())
+        if not self.global_bucket.try_acquire():
+            self.stats[f"{method} 429"] += 1
+            return self._too_many(self.global_bucket.retry_after())
+
+        self.stats[f"{method} ok"] += 1
+        self.delivered.append((time.monotonic(), chat_id, method))
+        message_id = int(data["message_id"]) if "message_id" in data else None
+        return web.json_response({"ok": True, "result": self._message(chat_id, data.get("text", ""), message_id)})
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+async def start_server(stub, host="127.0.0.1", port=0):
+    # Returns (runner, base_url); port 0 picks a free port
+    runner = web.AppRunner(stub.make_app(), handler_cancellation=True, shutdown_timeout=1)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Bot API stub that enforces Telegram flood limits")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    for key, value in DEFAULT_LIMITS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    limits = {key: getattr(args, key) for key in DEFAULT_LIMITS}
+    print(f"Telegram Bot API stub on http://{args.host}:{args.port} ({limits})")
+    web.run_app(StubTelegram(limits).make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
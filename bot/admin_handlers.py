@@ -1,16 +1,84 @@
 import os
+import asyncio
+import html
 from aiogram import Router, types, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 
 from bot.keyboards import admin_menu_kb
-from rag.global_rag import rag
+from bot.outbound import outbound
+from rag.global_rag import get_rag
 from bot.admin_storage import add_admin, remove_admin, get_admins, is_admin
-from rag.config import DOCS_DIR
+from bot import uploads
+from bot.state_store import get_store
+from rag.config import DOCS_DIR, JOB_PROGRESS_INTERVAL, MAX_UPLOAD_MB
+from rag.jobs import enqueue_job, get_job, list_jobs, cancel_job, ACTIVE_STATUSES, DONE
 
 router = Router()
 
-waiting_for_password = set()
+_job_trackers = set()
+
+JOB_STATUS_ICONS = {
+    "queued": "⏳",
+    "running": "⚙️",
+    "done": "✅",
+    "failed": "❌",
+    "cancelled": "🚫",
+}
+
+
+def format_job(job):
+    icon = JOB_STATUS_ICONS.get(job["status"], "")
+    target = job["payload"].get("path") or job["payload"].get("filename")
+    title = f"{icon} Job #{job['id']} ({job['kind']}): {job['status']}"
+    if target:
+        title += f"\n📄 {html.escape(os.path.basename(target))}"
+
+    progress = job["progress"]
+    lines = [title]
+    if progress:
+        lines.append(
+            f"Pages parsed: {progress.get('pages_parsed', 0)} | "
+            f"Chunks embedded: {progress.get('chunks_embedded', 0)} | "
+            f"Batches written: {progress.get('batches_written', 0)}"
+        )
+    if job["error"]:
+        lines.append(f"Error: {html.escape(job['error'])}")
+    return "\n".join(lines)
+
+
+async def track_job(message: Message, job_id: int):
+    last_text = None
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        text = format_job(job)
+        active = job["status"] in ACTIVE_STATUSES
+        # Progress edits are skipped while the chat is busy; the final status always goes out
+        if text != last_text and (not active or outbound.ready(message.chat.id)):
+            try:
+                await message.edit_text(text)
+            except TelegramBadRequest:
+                pass
+            last_text = text
+
+        if not active:
+            break
+        await asyncio.sleep(JOB_PROGRESS_INTERVAL)
+
+    # Queries pick up the change on their own; this only saves the admin the wait
+    if job["status"] == DONE:
+        await asyncio.to_thread(get_rag().reload_if_changed, True)
+
+
+async def submit_job(message: Message, kind: str, payload=None):
+    job_id = await asyncio.to_thread(enqueue_job, kind, payload)
+    status_message = await message.answer(f"⏳ Job #{job_id} queued")
+
+    task = asyncio.create_task(track_job(status_message, job_id))
+    _job_trackers.add(task)
+    task.add_done_callback(_job_trackers.discard)
+    return job_id
 
 
 def register_admin_handlers(dp, ADMIN_ID):
@@ -36,18 +104,21 @@ def register_admin_handlers(dp, ADMIN_ID):
         if not is_admin(message.from_user.id):
             return
 
-        file = await message.bot.get_file(message.document.file_id)
-        file_path = f"{DOCS_DIR}/{message.document.file_name}"
-        await message.bot.download_file(file.file_path, file_path)
-
-        await message.answer("📥 Document uploaded. Processing and building index...")
-
-        success = rag.add_document(file_path)
-
-        if success:
-            await message.answer("✅ Document added and index rebuilt! You can now ask questions about this document.")
+        result, document = await uploads.receive_upload(message)
+        if result == uploads.NOT_PDF:
+            return await message.answer("⚠️ Only PDF documents can be indexed.")
+        if result == uploads.TOO_LARGE:
+            return await message.answer(f"⚠️ The file is larger than {MAX_UPLOAD_MB:g} MB.")
+        if result == uploads.IN_PROGRESS:
+            return await message.answer("⏳ This document is already being processed.")
+        if result in (uploads.KNOWN_FILE, uploads.KNOWN_CONTENT):
+            return await message.answer(f"✅ Already indexed as {html.escape(document['filename'])}.")
+
+        if result == uploads.REINDEX:
+            await message.answer("📥 Document is already stored, indexing it again...")
         else:
-            await message.answer("❌ Error processing document. Please try again.")
+            await message.answer("📥 Document uploaded. Processing in background...")
+        await submit_job(message, "add_document", {"path": document["path"], "sha256": document["sha256"]})
 
     #  DELETE DOCUMENT
     @router.callback_query(F.data == "delete_doc")
@@ -55,7 +126,7 @@ def register_admin_handlers(dp, ADMIN_ID):
         if not is_admin(callback.from_user.id):
             return await callback.answer("⛔ No access")
 
-        files = os.listdir(DOCS_DIR)
+        files = [doc["filename"] for doc in get_store().list_documents()]
         if not files:
             return await callback.message.answer("No documents.")
 
@@ -75,7 +146,9 @@ def register_admin_handlers(dp, ADMIN_ID):
 
         filename = callback.data.split("del:")[1]
         os.remove(f"{DOCS_DIR}/{filename}")
+        get_store().unregister_document(filename)
         await callback.message.answer(f"❌ Deleted: {filename}")
+        await submit_job(callback.message, "remove_document", {"filename": filename})
         await callback.answer()
 
     #  LIST DOCS
@@ -84,7 +157,7 @@ def register_admin_handlers(dp, ADMIN_ID):
         if not is_admin(callback.from_user.id):
             return await callback.answer("⛔ No access")
 
-        files = os.listdir(DOCS_DIR)
+        files = [doc["filename"] for doc in get_store().list_documents()]
         msg = "\n".join([f"📄 {f}" for f in files]) or "No documents"
         await callback.message.answer(msg)
         await callback.answer()
@@ -95,19 +168,51 @@ def register_admin_handlers(dp, ADMIN_ID):
         if not is_admin(callback.from_user.id):
             return await callback.answer("⛔ No access")
 
-        await callback.message.answer("🔄 Rebuilding index...")
-        rag.rebuild_index()
-        await callback.message.answer("✅ Done!")
+        await callback.message.answer("🔄 Rebuilding index in background...")
+        await submit_job(callback.message, "rebuild_index")
+        await callback.answer()
+
+    #  JOBS
+    @router.callback_query(F.data == "list_jobs")
+    async def show_jobs(callback: CallbackQuery):
+        if not is_admin(callback.from_user.id):
+            return await callback.answer("⛔ No access")
+
+        jobs = await asyncio.to_thread(list_jobs, limit=10)
+        if not jobs:
+            await callback.message.answer("No jobs.")
+            return await callback.answer()
+
+        kb = types.InlineKeyboardMarkup(
+            inline_keyboard=[
+                [types.InlineKeyboardButton(text=f"🚫 Cancel job #{job['id']}", callback_data=f"cancel_job:{job['id']}")]
+                for job in jobs if job["status"] in ACTIVE_STATUSES
+            ]
+        )
+        msg = "\n\n".join(format_job(job) for job in jobs)
+        await callback.message.answer(msg, reply_markup=kb)
+        await callback.answer()
+
+    @router.callback_query(F.data.startswith("cancel_job:"))
+    async def cancel_job_callback(callback: CallbackQuery):
+        if not is_admin(callback.from_user.id):
+            return await callback.answer("⛔ No access")
+
+        job_id = int(callback.data.split("cancel_job:")[1])
+        if await asyncio.to_thread(cancel_job, job_id):
+            await callback.message.answer(f"🚫 Cancelling job #{job_id}")
+        else:
+            await callback.message.answer(f"Job #{job_id} is not running")
         await callback.answer()
 
     #  BECOME ADMIN
     @router.callback_query(F.data == "become_admin")
     async def process_become_admin(callback: CallbackQuery):
         await callback.message.answer("Enter administrator password:")
-        waiting_for_password.add(callback.from_user.id)
+        get_store().start_password_prompt(callback.from_user.id)
         await callback.answer()
 
-    @router.message(F.text, lambda message: message.from_user.id in waiting_for_password)
+    @router.message(F.text, lambda message: get_store().is_password_pending(message.from_user.id))
     async def check_password(message: Message):
         if message.text == "secret":
             add_admin(message.from_user.id)
@@ -119,7 +224,7 @@ def register_admin_handlers(dp, ADMIN_ID):
             )
         else:
             await message.answer("❌ Wrong password.")
-        waiting_for_password.remove(message.from_user.id)
+        get_store().finish_password_prompt(message.from_user.id)
 
     #  REMOVE MY ADMIN RIGHTS
     @router.callback_query(F.data == "remove_my_admin")
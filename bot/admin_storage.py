@@ -1,31 +1,20 @@
-import json
-import os
+from bot.state_store import get_store
 
-FILE = "admins.json"
+# Admins live in the shared state store (bot/state_store.py); admins.json is
+# only read once, to migrate existing admins
 
-if not os.path.exists(FILE):
-    with open(FILE, "w") as f:
-        json.dump({"admins": []}, f)
 
 def get_admins():
-    with open(FILE, "r") as f:
-        return json.load(f)["admins"]
+    return get_store().get_admins()
 
 def save_admins(admins):
-    with open(FILE, "w") as f:
-        json.dump({"admins": admins}, f)
+    get_store().set_admins(admins)
 
 def add_admin(user_id: int):
-    admins = get_admins()
-    if user_id not in admins:
-        admins.append(user_id)
-        save_admins(admins)
+    get_store().add_admin(user_id)
 
 def remove_admin(user_id: int):
-    admins = get_admins()
-    if user_id in admins:
-        admins.remove(user_id)
-        save_admins(admins)
+    get_store().remove_admin(user_id)
 
 def is_admin(user_id: int) -> bool:
-    return user_id in get_admins()
+    return get_store().is_admin(user_id)
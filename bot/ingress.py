@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from rag import metrics
+from rag.config import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_DEDUP_SIZE
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+INVALID = "invalid"
+FAILED = "failed"
+
+
+class UpdateIngress:
+    # Takes webhook updates off the HTTP request: submit() dedupes by update_id and
+    # queues the update, N worker tasks feed the queue to `handler`. A full queue
+    # rejects the update so Telegram redelivers it later instead of us buffering
+    # without bound. An update_id counts as seen from submit() on, so a redelivery
+    # while it runs is ignored, and is released again if the handler fails.
+    def __init__(self, handler, workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE,
+                 dedup_size=WEBHOOK_DEDUP_SIZE):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.dedup_size = dedup_size
+        self.queue = None
+        self._seen = OrderedDict()
+        self._tasks = []
+
+    def start(self):
+        # Must be called from the event loop the workers should run on
+        if self._tasks:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Webhook ingress started ({self.workers} workers, queue {self.max_queue})")
+
+    def _remember(self, update_id):
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return False
+        self._seen[update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def submit(self, update: dict):
+        # Returns (result, future resolved when the update has been handled)
+        update_id = update.get("update_id") if isinstance(update, dict) else None
+        if update_id is None:
+            metrics.WEBHOOK_UPDATES.inc(result=INVALID)
+            return INVALID, None
+
+        if not self._remember(update_id):
+            metrics.WEBHOOK_UPDATES.inc(result=DUPLICATE)
+            return DUPLICATE, None
+
+        done = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((update, time.perf_counter(), done))
+        except asyncio.QueueFull:
+            # Not processed, so the redelivery must not be treated as a duplicate
+            del self._seen[update_id]
+            metrics.WEBHOOK_UPDATES.inc(result=REJECTED)
+            logger.warning(f"Webhook queue full, rejecting update {update_id}")
+            return REJECTED, None
+
+        metrics.WEBHOOK_UPDATES.inc(result=QUEUED)
+        metrics.WEBHOOK_QUEUE_DEPTH.set(self.queue.qsize())
+        return QUEUED, done
+
+    async def _worker(self):
+        while True:
+            update, queued_at, done = await self.queue.get()
+            metrics.WEBHOOK_QUEUE_DEPTH.set(self.queue.qsize())
+            metrics.WEBHOOK_QUEUE_WAIT.observe(time.perf_counter() - queued_at)
+            try:
+                with metrics.WEBHOOK_UPDATE_SECONDS.time():
+                    result = await self.handler(update)
+                if not done.done():
+                    done.set_result(result)
+            except Exception as e:
+                logger.error(f"Error handling update {update.get('update_id')}: {e}")
+                self._seen.pop(update.get("update_id"), None)
+                metrics.WEBHOOK_UPDATES.inc(result=FAILED)
+                if not done.done():
+                    done.set_exception(e)
+                    # Nobody may be waiting for it
+                    done.exception()
+            finally:
+                self.queue.task_done()
+
+    async def stop(self, timeout=10):
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} queued updates on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class ThreadedIngress:
+    # For synchronous servers (the Vercel function): one event loop in a daemon
+    # thread owns the ingress, the bot session and the workers for the life of
+    # the instance; request threads hand updates over to it.
+    def __init__(self, handler, **kwargs):
+        self.ingress = UpdateIngress(handler, **kwargs)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="webhook-loop", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        self.ingress.start()
+
+    async def _submit(self, update, wait):
+        result, done = self.ingress.submit(update)
+        if done is not None and wait:
+            try:
+                await asyncio.wait_for(asyncio.shield(done), wait)
+            except asyncio.TimeoutError:
+                logger.warning(f"Update {update.get('update_id')} still running after {wait}s, acknowledging")
+            except Exception:
+                # Not acknowledged, so Telegram delivers it again
+                return FAILED
+        return result
+
+    def submit(self, update, wait=0):
+        return asyncio.run_coroutine_threadsafe(self._submit(update, wait), self.loop).result()
@@ -14,6 +14,7 @@ def admin_menu_kb(user_id: int):
             [InlineKeyboardButton(text="❌ Remove Document", callback_data="delete_doc")],
             [InlineKeyboardButton(text="📚 List Documents", callback_data="list_docs")],
             [InlineKeyboardButton(text="🔄 Rebuild Index", callback_data="rebuild_index")],
+            [InlineKeyboardButton(text="⚙️ Jobs", callback_data="list_jobs")],
             [InlineKeyboardButton(text="➖ Remove Admin Rights", callback_data="remove_my_admin")],
         ]
         return InlineKeyboardMarkup(inline_keyboard=admin_buttons + base_buttons)
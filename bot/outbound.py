@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from bot.rate_limit import TokenBucket
+from rag import metrics
+from rag.config import (
+    OUTBOUND_GLOBAL_PER_SECOND, OUTBOUND_CHAT_PER_MINUTE, OUTBOUND_GROUP_PER_MINUTE, OUTBOUND_CHAT_BURST,
+    OUTBOUND_MAX_RETRIES, PLACEHOLDER_DELAY,
+)
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Per-chat pacing state kept in memory; idle chats are dropped first
+MAX_TRACKED_CHATS = 10_000
+ERROR_TEXT = "⚠️ Something went wrong while answering. Please try again."
+
+
+def split_point(text, limit):
+    # Prefer a paragraph, then a line, then a word boundary in the second half
+    for separator in ("\n\n", "\n", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + len(separator)
+    return limit
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    parts = []
+    while len(text) > limit:
+        cut = split_point(text, limit)
+        head, text = text[:cut].rstrip(), text[cut:].lstrip()
+        if head:
+            parts.append(head)
+    if text.strip():
+        parts.append(text)
+    return parts
+
+
+class _Chat:
+    def __init__(self, per_minute, burst):
+        self.bucket = TokenBucket(per_minute, burst)
+        # asyncio.Lock wakes waiters in FIFO order, so calls to a chat keep their order
+        self.lock = asyncio.Lock()
+        self.paused_until = 0.0
+        self.waiting = 0
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    # Session middleware in front of every Bot API call that targets a chat. Calls
+    # to one chat go out one at a time, in order, paced by that chat's token
+    # bucket; all chats then share a global bucket. A 429 RetryAfter pauses the
+    # chat for the time Telegram asked for and the call is repeated.
+    def __init__(self, global_per_second=OUTBOUND_GLOBAL_PER_SECOND, chat_per_minute=OUTBOUND_CHAT_PER_MINUTE,
+                 group_per_minute=OUTBOUND_GROUP_PER_MINUTE, chat_burst=OUTBOUND_CHAT_BURST,
+                 max_retries=OUTBOUND_MAX_RETRIES):
+        self.chat_per_minute = chat_per_minute
+        self.group_per_minute = group_per_minute
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_per_second * 60, max(1, int(global_per_second)))
+        self._global_lock = asyncio.Lock()
+        self._chats = OrderedDict()
+        self._waiting = 0
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # Groups and channels have negative ids (or an @username)
+            group = not isinstance(chat_id, int) or chat_id < 0
+            per_minute = self.group_per_minute if group else self.chat_per_minute
+            chat = self._chats[chat_id] = _Chat(per_minute, self.chat_burst)
+            if len(self._chats) > MAX_TRACKED_CHATS:
+                oldest_id, oldest = next(iter(self._chats.items()))
+                if not oldest.waiting:
+                    del self._chats[oldest_id]
+        self._chats.move_to_end(chat_id)
+        return chat
+
+    def ready(self, chat_id):
+        # Whether a call to the chat would go out right away; optional updates
+        # (progress edits, intermediate stream edits) are skipped when it wouldn't
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            if chat.lock.locked() or chat.paused_until > time.monotonic() or chat.bucket.retry_after():
+                return False
+        return not self.global_bucket.retry_after()
+
+    async def _take(self, bucket):
+        while not bucket.try_acquire():
+            await asyncio.sleep(bucket.retry_after())
+
+    def _set_waiting(self, delta):
+        self._waiting += delta
+        metrics.OUTBOUND_QUEUE_DEPTH.set(self._waiting)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        name = type(method).__name__
+        chat = self._chat(chat_id)
+        chat.waiting += 1
+        self._set_waiting(1)
+        queued = time.monotonic()
+        try:
+            async with chat.lock:
+                for attempt in range(self.max_retries + 1):
+                    pause = chat.paused_until - time.monotonic()
+                    if pause > 0:
+                        await asyncio.sleep(pause)
+                    await self._take(chat.bucket)
+                    async with self._global_lock:
+                        await self._take(self.global_bucket)
+                    if attempt == 0:
+                        metrics.OUTBOUND_WAIT.observe(time.monotonic() - queued)
+
+                    try:
+                        response = await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        metrics.OUTBOUND_REQUESTS.inc(method=name, result="retry_after")
+                        chat.paused_until = time.monotonic() + e.retry_after
+                        logger.warning(f"{name} to chat {chat_id} rate limited, retrying in {e.retry_after}s")
+                        if attempt == self.max_retries:
+                            raise
+                        continue
+                    except Exception:
+                        metrics.OUTBOUND_REQUESTS.inc(method=name, result="error")
+                        raise
+                    metrics.OUTBOUND_REQUESTS.inc(method=name, result="ok")
+                    return response
+        finally:
+            chat.waiting -= 1
+            self._set_waiting(-1)
+
+
+outbound = OutboundQueue()
+
+
+class Reply:
+    # The bot's answer to one message. The placeholder is only sent if nothing
+    # has been shown after `delay` seconds (and outbound calls aren't backed up),
+    # and the answer then replaces it with an edit, so a question costs one
+    # message instead of two. Use as
+    # `async with Reply(message, "Searching...") as reply:`. If the block raises,
+    # a placeholder that was already sent is turned into `error_text`.
+    def __init__(self, source: Message, placeholder, delay=PLACEHOLDER_DELAY, error_text=ERROR_TEXT):
+        self.source = source
+        self.chat_id = source.chat.id
+        self.placeholder = placeholder
+        self.delay = delay
+        self.error_text = error_text
+        self.message = None
+        self.shown = ""
+        self.answered = False
+        self._lock = asyncio.Lock()
+        self._placeholder_task = None
+
+    async def __aenter__(self):
+        self._placeholder_task = asyncio.create_task(self._send_placeholder())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._cancel_placeholder()
+        if exc_type is None or not issubclass(exc_type, Exception):
+            return
+        task = self._placeholder_task
+        if task is not None and not task.done():
+            # Already being sent; wait so it doesn't stay "Searching..." forever
+            await asyncio.wait([task])
+        if self.message is None:
+            return
+        try:
+            await self.fail(self.error_text)
+        except Exception as e:
+            logger.error(f"Could not show the error in chat {self.chat_id}: {e}")
+
+    async def _send_placeholder(self):
+        await asyncio.sleep(self.delay)
+        async with self._lock:
+            # Under a backlog the placeholder would only delay answers queued behind it
+            if self.message is None and outbound.ready(self.chat_id):
+                self.message = await self.source.answer(self.placeholder)
+                self.shown = self.placeholder
+
+    def _cancel_placeholder(self):
+        # Only while it is waiting out the delay; once it holds the lock, the
+        # placeholder goes out and the answer edits it
+        task = self._placeholder_task
+        if task is not None and not task.done() and not self._lock.locked():
+            task.cancel()
+
+    async def show(self, text, wait=True, **kwargs):
+        # Puts `text` into the current message, sending one if there is none yet.
+        # Returns False when wait=False and the chat isn't ready (the update is skipped)
+        if not wait and not outbound.ready(self.chat_id):
+            return False
+        self._cancel_placeholder()
+        async with self._lock:
+            if self.message is None:
+                self.message = await self.source.answer(text, **kwargs)
+            else:
+                try:
+                    await self.message.edit_text(text, **kwargs)
+                except TelegramBadRequest as e:
+                    if "message is not modified" not in str(e):
+                        raise
+            self.shown = text
+            self.answered = True
+        return True
+
+    async def new_message(self, text, **kwargs):
+        # Continues in a fresh message once the current one is full
+        self._cancel_placeholder()
+        async with self._lock:
+            self.message = await self.source.answer(text, **kwargs)
+            self.shown = text
+            self.answered = True
+
+    async def finish(self, text, **kwargs):
+        # A complete answer: the first part replaces the placeholder, the rest follow
+        parts = split_message(text) or ["…"]
+        await self.show(parts[0], **kwargs)
+        for part in parts[1:]:
+            await self.new_message(part, **kwargs)
+
+    async def fail(self, text):
+        # Replaces the placeholder, but never a partly shown answer
+        if self.answered:
+            await self.new_message(text)
+        else:
+            await self.finish(text)
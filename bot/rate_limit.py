@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+from rag import metrics
+from rag.config import (
+    USER_QUESTIONS_PER_MINUTE, USER_QUESTION_BURST, GLOBAL_QUESTIONS_PER_MINUTE, GLOBAL_QUESTION_BURST,
+)
+
+# Per-user buckets kept in memory; the least recently seen users are dropped first
+MAX_TRACKED_USERS = 10_000
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self):
+        # Seconds until the next token
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    # A bucket per user against floods from one chat, and one shared bucket that
+    # caps new Gemini-bound work to what the API quota allows. Over the limit the
+    # question is turned away instead of queued.
+    def __init__(self, user_per_minute=USER_QUESTIONS_PER_MINUTE, user_burst=USER_QUESTION_BURST,
+                 global_per_minute=GLOBAL_QUESTIONS_PER_MINUTE, global_burst=GLOBAL_QUESTION_BURST):
+        self.user_per_minute = user_per_minute
+        self.user_burst = user_burst
+        self.global_bucket = TokenBucket(global_per_minute, global_burst)
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check_user(self, user_id):
+        # Returns seconds to wait, 0 when allowed
+        with self._lock:
+            bucket = self._users.get(user_id)
+            if bucket is None:
+                bucket = self._users[user_id] = TokenBucket(self.user_per_minute, self.user_burst)
+                if len(self._users) > MAX_TRACKED_USERS:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            if bucket.try_acquire():
+                return 0.0
+            metrics.RATE_LIMITED.inc(scope="user")
+            return bucket.retry_after()
+
+    def check_global(self):
+        with self._lock:
+            if self.global_bucket.try_acquire():
+                return 0.0
+            metrics.RATE_LIMITED.inc(scope="global")
+            return self.global_bucket.retry_after()
+
+
+limiter = RateLimiter()
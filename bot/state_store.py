@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from rag.config import STATE_DB_PATH, ADMINS_JSON_PATH, PASSWORD_PROMPT_TTL, DOCS_DIR
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_COLUMNS = ("filename", "path", "size", "sha256", "uploaded_by", "uploaded_at", "file_unique_id")
+
+
+class StateStore:
+    # SQLite (WAL) so several bot processes can share it. Reads come from an
+    # in-memory snapshot that is reloaded only when PRAGMA data_version says
+    # another connection committed; every write is a single transaction.
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS admins (
+                user_id INTEGER PRIMARY KEY,
+                added_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pending_passwords (
+                user_id INTEGER PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                filename TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER,
+                sha256 TEXT,
+                uploaded_by INTEGER,
+                uploaded_at REAL NOT NULL,
+                file_unique_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        # Databases created before uploads were deduplicated by Telegram file id
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "file_unique_id" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN file_unique_id TEXT")
+        self._cache = None
+        self._version = None
+
+    def _load(self):
+        conn = self._conn
+        return {
+            "admins": frozenset(user_id for user_id, in conn.execute("SELECT user_id FROM admins")),
+            "pending": dict(conn.execute("SELECT user_id, expires_at FROM pending_passwords")),
+            "documents": {
+                row[0]: dict(zip(DOCUMENT_COLUMNS, row))
+                for row in conn.execute(f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents ORDER BY filename")
+            },
+        }
+
+    def _snapshot(self):
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._cache is None or version != self._version:
+                self._cache = self._load()
+                self._version = version
+            return self._cache
+
+    def _write(self, *statements):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # data_version doesn't change for our own commits
+            self._cache = None
+
+    # Admins
+    def get_admins(self):
+        return sorted(self._snapshot()["admins"])
+
+    def is_admin(self, user_id):
+        return user_id in self._snapshot()["admins"]
+
+    def add_admin(self, user_id):
+        self._write(("INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, ?)", (user_id, time.time())))
+
+    def remove_admin(self, user_id):
+        self._write(("DELETE FROM admins WHERE user_id = ?", (user_id,)))
+
+    def set_admins(self, user_ids):
+        now = time.time()
+        self._write(
+            ("DELETE FROM admins", ()),
+            *[("INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, ?)", (user_id, now)) for user_id in user_ids],
+        )
+
+    # Pending "enter administrator password" prompts
+    def start_password_prompt(self, user_id, ttl=PASSWORD_PROMPT_TTL):
+        self._write((
+            "INSERT OR REPLACE INTO pending_passwords (user_id, expires_at) VALUES (?, ?)",
+            (user_id, time.time() + ttl),
+        ))
+
+    def is_password_pending(self, user_id):
+        expires_at = self._snapshot()["pending"].get(user_id)
+        return expires_at is not None and expires_at > time.time()
+
+    def finish_password_prompt(self, user_id):
+        self._write(
+            ("DELETE FROM pending_passwords WHERE user_id = ?", (user_id,)),
+            ("DELETE FROM pending_passwords WHERE expires_at <= ?", (time.time(),)),
+        )
+
+    # Uploaded documents
+    def list_documents(self):
+        return list(self._snapshot()["documents"].values())
+
+    def get_document(self, filename):
+        return self._snapshot()["documents"].get(filename)
+
+    def find_document(self, sha256=None, file_unique_id=None):
+        for document in self._snapshot()["documents"].values():
+            if sha256 is not None and document["sha256"] == sha256:
+                return document
+            if file_unique_id is not None and document["file_unique_id"] == file_unique_id:
+                return document
+        return None
+
+    def register_document(self, filename, path, size=None, sha256=None, uploaded_by=None, file_unique_id=None):
+        self._write((
+            "INSERT OR REPLACE INTO documents (filename, path, size, sha256, uploaded_by, uploaded_at, file_unique_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (filename, path, size, sha256, uploaded_by, time.time(), file_unique_id),
+        ))
+
+    def set_file_unique_id(self, filename, file_unique_id):
+        # The same content sent again as a different Telegram file
+        self._write(("UPDATE documents SET file_unique_id = ? WHERE filename = ?", (file_unique_id, filename)))
+
+    def unregister_document(self, filename):
+        self._write(("DELETE FROM documents WHERE filename = ?", (filename,)))
+
+    def sync_documents(self, docs_dir=DOCS_DIR):
+        # Files copied into DOCS_DIR by hand, or removed from it, since the last start
+        on_disk = {f for f in os.listdir(docs_dir) if os.path.isfile(os.path.join(docs_dir, f))}
+        known = set(self._snapshot()["documents"])
+        statements = [("DELETE FROM documents WHERE filename = ?", (f,)) for f in known - on_disk]
+        for filename in sorted(on_disk - known):
+            path = os.path.join(docs_dir, filename)
+            statements.append((
+                "INSERT OR IGNORE INTO documents (filename, path, size, uploaded_at) VALUES (?, ?, ?, ?)",
+                (filename, path, os.path.getsize(path), os.path.getmtime(path)),
+            ))
+        if statements:
+            self._write(*statements)
+
+    def migrate_admins_json(self, path=ADMINS_JSON_PATH):
+        # One-time import of the old admins.json; the file is left in place
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM meta WHERE key = 'admins_json_migrated'").fetchone()
+        if done or not os.path.exists(path):
+            return 0
+
+        with open(path, "r") as f:
+            admins = json.load(f).get("admins", [])
+        now = time.time()
+        self._write(
+            *[("INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, ?)", (int(a), now)) for a in admins],
+            ("INSERT OR REPLACE INTO meta (key, value) VALUES ('admins_json_migrated', ?)", (str(now),)),
+        )
+        return len(admins)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = StateStore()
+                migrated = store.migrate_admins_json()
+                if migrated:
+                    logger.info(f"Imported {migrated} admins from {ADMINS_JSON_PATH}")
+                store.sync_documents()
+                _store = store
+    return _store
@@ -0,0 +1,61 @@
+import logging
+import time
+
+from bot.outbound import Reply, TELEGRAM_MESSAGE_LIMIT, split_point
+from rag.config import STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingReply:
+    # Edits one message as text arrives, at most once per `interval` seconds
+    # (Telegram rate-limits edits), and continues in a new message once it is full
+    def __init__(self, reply: Reply, interval=STREAM_EDIT_INTERVAL):
+        self.reply = reply
+        self.interval = interval
+        self.text = ""
+        self.next_edit = 0.0
+        self.started = time.perf_counter()
+        self.first_token_seconds = None
+
+    async def _edit(self, text, wait=False):
+        if not text.strip() or text == self.reply.shown:
+            return
+        # Plain text: a half-streamed answer can't be valid HTML
+        if not await self.reply.show(text, wait=wait, parse_mode=None):
+            # The chat is busy or rate limited; the next edit carries the text anyway
+            return
+
+        self.next_edit = time.monotonic() + self.interval
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+            logger.info(f"First answer text shown after {self.first_token_seconds:.2f}s")
+
+    async def append(self, piece):
+        self.text += piece
+        while len(self.text) > TELEGRAM_MESSAGE_LIMIT:
+            cut = split_point(self.text, TELEGRAM_MESSAGE_LIMIT)
+            head, self.text = self.text[:cut].rstrip(), self.text[cut:].lstrip()
+            await self._edit(head, wait=True)
+            await self.reply.new_message(self.text[:TELEGRAM_MESSAGE_LIMIT] or "…", parse_mode=None)
+            self.next_edit = time.monotonic() + self.interval
+
+        if time.monotonic() >= self.next_edit:
+            await self._edit(self.text)
+
+    async def finish(self):
+        await self._edit(self.text, wait=True)
+
+
+async def stream_reply(reply: Reply, pieces):
+    # reply: where the answer goes (replaces its placeholder); pieces: async iterator of answer text
+    stream = StreamingReply(reply)
+    try:
+        async for piece in pieces:
+            await stream.append(piece)
+    finally:
+        try:
+            await stream.finish()
+        except Exception as e:
+            logger.error(f"Could not finish streamed answer: {e}")
+    return stream.text
@@ -8,8 +8,13 @@ from aiogram.types import Update
 from aiohttp import web
 
 from bot.admin_handlers import register_admin_handlers
+from bot.ingress import UpdateIngress, QUEUED, DUPLICATE, REJECTED
+from bot.outbound import outbound
 from bot.user_handlers import register_user_handlers
-from rag.config import DOCS_DIR
+from rag.config import DOCS_DIR, START_INGEST_WORKER, WARMUP_ON_START
+from rag.global_rag import startup_timings, startup_status, warmup
+from rag.metrics import render_prometheus
+from rag.ingest_worker import start_worker_process
 
 import logging
 
@@ -18,6 +23,8 @@ logger = logging.getLogger(__name__)
 
 bot_instance = None
 dp_instance = None
+ingest_worker = None
+warmup_task = None
 
 
 async def setup_bot():
@@ -27,48 +34,88 @@ async def setup_bot():
         return bot_instance, dp_instance
 
     logger.info("Setting up Telegram bot...")
+    with startup_timings.measure("bot_setup"):
+        bot_instance, dp_instance = _create_bot()
 
+    logger.info("Bot setup completed")
+    return bot_instance, dp_instance
+
+
+def _create_bot():
     TOKEN = os.getenv("TG_TOKEN")
     if not TOKEN:
         raise ValueError("TG_TOKEN not found in environment variables")
 
     ADMIN_ID = int(os.getenv("ADMIN_ID", 0))
 
-    bot_instance = Bot(
+    bot = Bot(
         token=TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp_instance = Dispatcher()
+    # Every call to a chat is paced and retried on RetryAfter
+    bot.session.middleware(outbound)
+    dp = Dispatcher()
 
-    register_admin_handlers(dp_instance, ADMIN_ID)
-    register_user_handlers(dp_instance)
+    register_admin_handlers(dp, ADMIN_ID)
+    register_user_handlers(dp)
+    return bot, dp
 
-    logger.info("Bot setup completed")
-    return bot_instance, dp_instance
+
+def start_ingest_worker():
+    global ingest_worker
+
+    if not START_INGEST_WORKER or ingest_worker is not None:
+        return
+
+    ingest_worker = start_worker_process()
+    logger.info(f"Ingest worker started (pid {ingest_worker.pid})")
+
+
+async def run_warmup():
+    status = await asyncio.to_thread(warmup)
+    logger.info(f"Warmup finished: {status['phases']}")
+    return status
+
+
+def start_warmup():
+    # Long-running instances load the model and index in the background so
+    # the first question doesn't pay for it
+    global warmup_task
+
+    if not WARMUP_ON_START or warmup_task is not None:
+        return
+
+    warmup_task = asyncio.create_task(run_warmup())
 
 
 async def process_webhook_update(update_data: dict):
-    try:
-        bot, dp = await setup_bot()
+    # Errors propagate: the ingress logs them and forgets the update_id, so a
+    # redelivery is handled again
+    bot, dp = await setup_bot()
 
-        update = Update(**update_data)
+    update = Update(**update_data)
 
-        await dp.feed_webhook_update(bot, update)
+    await dp.feed_webhook_update(bot, update)
 
-        return {"status": "ok"}
+    return {"status": "ok"}
 
-    except Exception as e:
-        logger.error(f"Error processing update: {e}")
-        return {"status": "error", "message": str(e)}
+
+ingress = UpdateIngress(process_webhook_update)
 
 
 async def handle_webhook(request: web.Request):
+    # Acknowledge at once; answering can take longer than Telegram waits
+    # before redelivering the update
     try:
         data = await request.json()
 
-        response = await process_webhook_update(data)
+        result, _ = ingress.submit(data)
 
-        return web.json_response(response)
+        if result == REJECTED:
+            return web.json_response({"status": "busy"}, status=503, headers={"Retry-After": "5"})
+        if result not in (QUEUED, DUPLICATE):
+            return web.Response(status=400, text="Invalid update")
+        return web.json_response({"status": result})
 
     except json.JSONDecodeError:
         logger.error("Invalid JSON received")
@@ -79,13 +126,31 @@ async def handle_webhook(request: web.Request):
 
 
 async def health_check(request):
-    return web.Response(text="Bot webhook server is running!")
+    return web.json_response({"status": "ok", **startup_status()})
+
+
+async def metrics_handler(request):
+    return web.Response(
+        body=render_prometheus().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def warmup_handler(request):
+    try:
+        status = await run_warmup()
+        return web.json_response({"status": "ok", **status})
+    except Exception as e:
+        logger.error(f"Warmup failed: {e}")
+        return web.json_response({"status": "error", "message": str(e), **startup_status()}, status=500)
 
 
 async def start_polling():
     bot, dp = await setup_bot()
 
     await bot.delete_webhook(drop_pending_updates=True)
+    start_ingest_worker()
+    start_warmup()
 
     logger.info("Starting bot in polling mode...")
     await dp.start_polling(bot)
@@ -107,14 +172,28 @@ async def set_webhook_url():
     return False
 
 
+async def start_ingress(app):
+    ingress.start()
+
+
+async def stop_ingress(app):
+    await ingress.stop()
+
+
 async def start_local_webhook_server():
     app = web.Application()
 
     app.router.add_get('/health', health_check)
     app.router.add_get('/', health_check)
+    app.router.add_get('/warmup', warmup_handler)
+    app.router.add_get('/metrics', metrics_handler)
     app.router.add_post('/api/bot', handle_webhook)
+    app.on_startup.append(start_ingress)
+    app.on_cleanup.append(stop_ingress)
 
     await setup_bot()
+    start_ingest_worker()
+    start_warmup()
 
     port = int(os.environ.get('PORT', 8080))
     runner = web.AppRunner(app)
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from aiogram.types import Message
+
+from bot.state_store import get_store
+from rag import metrics
+from rag.config import DOCS_DIR, MAX_UPLOAD_MB, UPLOAD_CHUNK_SIZE, UPLOAD_TIMEOUT
+from rag.jobs import list_jobs
+from rag.manifest import DocumentManifest
+
+logger = logging.getLogger(__name__)
+
+# Partial downloads; on the same filesystem as DOCS_DIR so the final move is a rename
+UPLOADS_DIR = os.path.join(DOCS_DIR, ".uploads")
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+ACCEPTED = "accepted"
+# Indexing is (re)started for a file that is already on disk
+REINDEX = "reindex"
+KNOWN_FILE = "known_file"
+KNOWN_CONTENT = "known_content"
+IN_PROGRESS = "in_progress"
+TOO_LARGE = "too_large"
+NOT_PDF = "not_pdf"
+
+_in_progress = set()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class HashingWriter:
+    # Destination for Bot.download_file(): every chunk is hashed and counted as it
+    # is written, and the download stops once it passes the size limit
+    def __init__(self, path, limit=MAX_UPLOAD_BYTES):
+        self.file = open(path, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadTooLarge(f"Upload is larger than {self.limit} bytes")
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        # aiogram flushes after every chunk; closing the file is enough
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+def _has_active_job(path):
+    return any(job["payload"].get("path") == path for job in list_jobs(limit=50, active_only=True))
+
+
+def _check_known(document):
+    # For a file that is already on disk: indexed, being indexed, or to be indexed again.
+    # Blocking (job table, manifest file), run it with asyncio.to_thread
+    if _has_active_job(document["path"]):
+        return IN_PROGRESS
+    # The manifest on disk, not the bot's copy, which lags until its next reload
+    if document["sha256"] in DocumentManifest():
+        return KNOWN_FILE
+    return REINDEX
+
+
+async def _download(message: Message, part_path):
+    writer = HashingWriter(part_path, MAX_UPLOAD_BYTES)
+    try:
+        file = await message.bot.get_file(message.document.file_id)
+        await message.bot.download_file(
+            file.file_path, writer, timeout=UPLOAD_TIMEOUT, chunk_size=UPLOAD_CHUNK_SIZE, seek=False
+        )
+    except BaseException:
+        writer.close()
+        os.remove(part_path)
+        raise
+    writer.close()
+    metrics.UPLOAD_BYTES.inc(writer.size)
+    return writer.digest.hexdigest(), writer.size
+
+
+async def receive_upload(message: Message):
+    # Returns (result, document record); the record is None when nothing was stored
+    result, record = await _receive(message)
+    metrics.UPLOADS.inc(result=result)
+    return result, record
+
+
+async def _receive(message: Message):
+    document = message.document
+    filename = os.path.basename(document.file_name or "")
+    if not filename.lower().endswith(".pdf"):
+        return NOT_PDF, None
+    if document.file_size and document.file_size > MAX_UPLOAD_BYTES:
+        return TOO_LARGE, None
+    if document.file_unique_id in _in_progress:
+        return IN_PROGRESS, None
+
+    record = get_store().find_document(file_unique_id=document.file_unique_id)
+    if record is not None and os.path.exists(record["path"]):
+        # Telegram says this exact file was uploaded before: no download at all
+        return await asyncio.to_thread(_check_known, record), record
+
+    _in_progress.add(document.file_unique_id)
+    try:
+        return await _store_upload(message, filename)
+    finally:
+        _in_progress.discard(document.file_unique_id)
+
+
+async def _store_upload(message: Message, filename):
+    document = message.document
+    store = get_store()
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    part_path = os.path.join(UPLOADS_DIR, f"{document.file_unique_id}.part")
+
+    try:
+        sha256, size = await _download(message, part_path)
+    except UploadTooLarge:
+        return TOO_LARGE, None
+
+    # Same content sent as a different file (forwarded copy, renamed file)
+    known = store.find_document(sha256=sha256)
+    if known is not None and os.path.exists(known["path"]):
+        os.remove(part_path)
+        store.set_file_unique_id(known["filename"], document.file_unique_id)
+        result = await asyncio.to_thread(_check_known, known)
+        return (KNOWN_CONTENT if result == KNOWN_FILE else result), known
+
+    # A new version under an existing name replaces the old one (add_document handles the index side)
+    file_path = os.path.join(DOCS_DIR, filename)
+    os.replace(part_path, file_path)
+    store.register_document(
+        filename, file_path, size=size, sha256=sha256,
+        uploaded_by=message.from_user.id, file_unique_id=document.file_unique_id,
+    )
+    logger.info(f"Stored upload {filename} ({size} bytes, sha256 {sha256[:12]})")
+    return ACCEPTED, store.get_document(filename)
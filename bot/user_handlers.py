@@ -1,8 +1,17 @@
+import logging
+
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
 
-from rag.global_rag import rag
+from bot.outbound import Reply
+from bot.rate_limit import limiter
+from bot.streaming import stream_reply
+from rag.config import STREAM_ANSWERS
+from rag.gemini_client import GeminiUnavailable
+from rag.global_rag import get_rag
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
@@ -21,7 +30,26 @@ def register_user_handlers(dp):
     @router.message(F.text & ~F.command)
     async def answer(message: Message):
         query = message.text
-        await message.answer("Searching the answer...")
 
-        response = rag.query(query)
-        await message.answer(response)
+        wait = limiter.check_user(message.from_user.id)
+        if wait:
+            return await message.answer(f"⏳ You're asking too fast. Please try again in {max(1, round(wait))} seconds.")
+
+        # Joining an identical question that is already being answered costs no Gemini call
+        if not get_rag().is_in_flight(query) and limiter.check_global():
+            return await message.answer("⏳ I'm answering a lot of questions right now. Please try again in a minute.")
+
+        # Quick answers arrive without a placeholder, slow ones replace it
+        async with Reply(message, "Searching the answer...") as reply:
+            try:
+                if STREAM_ANSWERS:
+                    await stream_reply(reply, get_rag().astream(query))
+                    return
+                response = await get_rag().aquery(query)
+            except GeminiUnavailable as e:
+                logger.warning(f"No answer for {message.from_user.id}: {e}")
+                return await reply.fail(
+                    "⚠️ The answer service is not responding right now. Please try again in a minute."
+                )
+
+            await reply.finish(response)
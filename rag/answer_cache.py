@@ -0,0 +1,119 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class AnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.index_version = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    def validate(self, index_version):
+        # Answers are only valid for the index they were generated from
+        with self._lock:
+            if index_version != self.index_version:
+                self._clear()
+                self.index_version = index_version
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        self._matrix = None
+
+    def _expired(self, entry):
+        return time.monotonic() - entry["created_at"] > self.ttl
+
+    def _drop(self, key):
+        del self.entries[key]
+        self._matrix = None
+
+    def get_exact(self, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._drop(key)
+                return None
+
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["answer"]
+
+    def get_similar(self, vector):
+        query = _unit(vector)
+        with self._lock:
+            if self.entries and self._matrix is None:
+                self._matrix_keys = list(self.entries)
+                self._matrix = np.stack([self.entries[k]["vector"] for k in self._matrix_keys])
+
+            if self._matrix is not None:
+                scores = self._matrix @ query
+                best = int(np.argmax(scores))
+                key = self._matrix_keys[best]
+                entry = self.entries[key]
+                if scores[best] >= self.similarity_threshold and not self._expired(entry):
+                    self.entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def put(self, question, vector, answer, index_version):
+        # index_version: what validate() was given when the question was retrieved
+        key = normalize_question(question)
+        with self._lock:
+            if index_version != self.index_version:
+                # Answered from an index that has been replaced since
+                return
+            self.entries[key] = {
+                "answer": answer,
+                "vector": _unit(vector),
+                "created_at": time.monotonic(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
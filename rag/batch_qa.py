@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from rag.config import BATCH_QA_SIZE, BATCH_QA_CONCURRENCY
+from rag.rag_pipeline import RAGPipeline, ask_gemini_async, NO_DOCUMENTS
+
+# Answers a JSONL file of questions ({"id": ..., "question": ...} or a bare string per
+# line) for regression checks and FAQ pre-generation. Each batch of questions is
+# embedded in one forward pass and searched with one vectorized index call while
+# the previous batch is with Gemini. Results are appended to the output JSONL as
+# they finish, so an interrupted run continues where it stopped.
+
+
+def read_questions(path):
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            # Without an id the line number keeps resuming stable
+            item.setdefault("id", number)
+            yield item
+
+
+def load_answered(path):
+    # Ids answered by an earlier run. A line cut short by the interruption is dropped;
+    # failed questions are asked again and the later line for an id wins.
+    answered = set()
+    if not os.path.exists(path):
+        return answered
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        record = json.loads(line)
+        if "error" not in record:
+            answered.add(record["id"])
+    return answered
+
+
+def prepare_batch(rag, items):
+    # Embedding and retrieval for a batch: [(item, candidate docs, context, timings)]
+    questions = [item["question"] for item in items]
+    started = time.perf_counter()
+    vectors = rag.query_embedder.embed_queries(questions)
+    embedded = time.perf_counter()
+    retrieved = rag.retrieve_batch(questions, vectors, rag.context_candidates)
+    searched = time.perf_counter()
+
+    prepared = []
+    for item, docs in zip(items, retrieved):
+        context_started = time.perf_counter()
+        context = rag.build_context(item["question"], docs)
+        prepared.append((item, docs, context, {
+            # Batch stages are shared, each question is charged its part
+            "embed_ms": 1000 * (embedded - started) / len(items),
+            "search_ms": 1000 * (searched - embedded) / len(items),
+            "context_ms": 1000 * (time.perf_counter() - context_started),
+        }))
+    return prepared
+
+
+async def answer_prepared(item, docs, context, timings):
+    record = {"id": item["id"], "question": item["question"], "chunk_ids": [d.id for d in docs]}
+    started = time.perf_counter()
+    try:
+        record["answer"] = await ask_gemini_async(item["question"], context)
+    except Exception as e:
+        # Recorded and retried on the next run instead of stopping the batch
+        record["error"] = f"{type(e).__name__}: {e}"
+    timings["generate_ms"] = 1000 * (time.perf_counter() - started)
+    record["timings"] = {stage: round(ms, 2) for stage, ms in timings.items()}
+    return record
+
+
+async def answer_file(rag, input_path, output_path, batch_size=BATCH_QA_SIZE, concurrency=BATCH_QA_CONCURRENCY):
+    # Returns {"answered": n, "failed": n, "skipped": n}
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, rag.ensure_loaded)
+    if not rag.vectorstore or not rag.vectorstore.count():
+        raise RuntimeError(NO_DOCUMENTS)
+
+    answered = load_answered(output_path)
+    pending, seen = [], set(answered)
+    for item in read_questions(input_path):
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            pending.append(item)
+    counts = {"answered": 0, "failed": 0, "skipped": len(answered)}
+    print(f"{len(answered)} questions already answered, {len(pending)} to go")
+
+    # Holds about one batch: the next one is embedded and searched while this one is answered
+    queue = asyncio.Queue(maxsize=batch_size)
+
+    async def produce():
+        try:
+            for start in range(0, len(pending), batch_size):
+                prepared = await loop.run_in_executor(None, prepare_batch, rag, pending[start:start + batch_size])
+                for entry in prepared:
+                    await queue.put(entry)
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def consume():
+            while (entry := await queue.get()) is not None:
+                record = await answer_prepared(*entry)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["failed" if "error" in record else "answered"] += 1
+                done = counts["answered"] + counts["failed"]
+                if done % 50 == 0:
+                    print(f"{done}/{len(pending)} questions done")
+
+        await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batch")
+    parser.add_argument("input", help='JSONL with {"id": ..., "question": ...} or a string per line')
+    parser.add_argument("--output", default="answers.jsonl", help="appended to; rerun to resume")
+    parser.add_argument("--batch-size", type=int, default=BATCH_QA_SIZE, help="questions embedded/searched together")
+    parser.add_argument("--concurrency", type=int, default=BATCH_QA_CONCURRENCY, help="Gemini calls in flight")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = asyncio.run(answer_file(RAGPipeline(), args.input, args.output, args.batch_size, args.concurrency))
+    elapsed = time.perf_counter() - started
+    print(
+        f"Answered {counts['answered']}, failed {counts['failed']}, skipped {counts['skipped']} "
+        f"in {elapsed:.1f}s; results in {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
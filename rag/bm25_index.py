@@ -0,0 +1,177 @@
+import math
+import os
+import pickle
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from rag.config import BM25_INDEX_PATH, BM25_K1, BM25_B
+
+WORD_RE = re.compile(r"[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)*|\d+")
+
+# Tombstoned documents are dropped from the postings once they pass this share
+COMPACT_RATIO = 0.25
+
+
+def tokenize(text):
+    # Keep API names whole ("dataframe.pivot_table") and also index their parts
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        tokens.append(word)
+        if "." in word or "_" in word:
+            for part in word.split("."):
+                if part != word:
+                    tokens.append(part)
+                if "_" in part:
+                    tokens.extend(p for p in part.split("_") if p)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, path=BM25_INDEX_PATH, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        self.chunk_ids = []
+        self.doc_lens = array("I")
+        self.alive = bytearray()
+        self.positions = {}
+        # term -> (doc numbers, term frequencies)
+        self.postings = {}
+        self.total_len = 0
+        self.n_alive = 0
+
+    def __len__(self):
+        return self.n_alive
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.positions
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.clear()
+            return
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        self.chunk_ids = state["chunk_ids"]
+        self.doc_lens = state["doc_lens"]
+        self.alive = state["alive"]
+        self.postings = state["postings"]
+        self.total_len = state["total_len"]
+        self.n_alive = state["n_alive"]
+        self.positions = {
+            chunk_id: n for n, chunk_id in enumerate(self.chunk_ids) if self.alive[n]
+        }
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "chunk_ids": self.chunk_ids,
+                "doc_lens": self.doc_lens,
+                "alive": self.alive,
+                "postings": self.postings,
+                "total_len": self.total_len,
+                "n_alive": self.n_alive,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def add(self, chunk_ids, texts):
+        self.remove([c for c in chunk_ids if c in self.positions])
+
+        for chunk_id, text in zip(chunk_ids, texts):
+            n = len(self.chunk_ids)
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+
+            self.chunk_ids.append(chunk_id)
+            self.doc_lens.append(length)
+            self.alive.append(1)
+            self.positions[chunk_id] = n
+            self.total_len += length
+            self.n_alive += 1
+
+            for term, tf in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("I"), array("H"))
+                postings[0].append(n)
+                postings[1].append(min(tf, 65535))
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            n = self.positions.pop(chunk_id, None)
+            if n is None:
+                continue
+            self.alive[n] = 0
+            self.total_len -= self.doc_lens[n]
+            self.n_alive -= 1
+
+        dead = len(self.chunk_ids) - self.n_alive
+        if dead and dead > COMPACT_RATIO * len(self.chunk_ids):
+            self._compact()
+
+    def _compact(self):
+        remap = {}
+        chunk_ids = []
+        doc_lens = array("I")
+        for n, chunk_id in enumerate(self.chunk_ids):
+            if self.alive[n]:
+                remap[n] = len(chunk_ids)
+                chunk_ids.append(chunk_id)
+                doc_lens.append(self.doc_lens[n])
+
+        postings = {}
+        for term, (docs, tfs) in self.postings.items():
+            new_docs, new_tfs = array("I"), array("H")
+            for doc, tf in zip(docs, tfs):
+                if doc in remap:
+                    new_docs.append(remap[doc])
+                    new_tfs.append(tf)
+            if new_docs:
+                postings[term] = (new_docs, new_tfs)
+
+        self.chunk_ids = chunk_ids
+        self.doc_lens = doc_lens
+        self.alive = bytearray(b"\x01" * len(chunk_ids))
+        self.postings = postings
+        self.positions = {chunk_id: n for n, chunk_id in enumerate(chunk_ids)}
+
+    def search(self, query, k=10):
+        if not self.n_alive:
+            return []
+
+        n_docs = len(self.chunk_ids)
+        avg_len = self.total_len / self.n_alive
+        doc_lens = np.frombuffer(self.doc_lens, dtype=np.uint32)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            df = len(docs)
+            idf = math.log(1 + (self.n_alive - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lens[docs] / avg_len)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        scores[np.frombuffer(self.alive, dtype=np.uint8) == 0] = 0
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.chunk_ids[n] for n in top if scores[n] > 0]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,93 +1,161 @@
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from rag.config import VECTORSTORE_PATH, EMBEDDING_MODEL
+from rag.config import INGEST_BATCH_SIZE
+from rag.jobs import JobCancelled
 import pymupdf
+import bisect
+import itertools
 import os
-import shutil
 
+SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", " ", ""]
 
-def load_pdf(path):
+# Pages are split once the buffer holds this many chunks' worth of text
+SPLIT_BUFFER_CHUNKS = 8
+
+
+def iter_pdf_pages(path, progress=None, start_page=0, end_page=None):
     doc = pymupdf.open(path)
-    text = ""
+    try:
+        end_page = len(doc) if end_page is None else min(end_page, len(doc))
+        for page_num in range(start_page, end_page):
+            page = doc[page_num]
+            yield page_num + 1, f"\nPage {page_num + 1} \n" + page.get_text("text") + "\n"
+            if progress:
+                progress.update(pages_parsed=1)
+    finally:
+        doc.close()
 
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text += f"\nPage {page_num + 1} \n"
-        text += page.get_text("text") + "\n"
 
-    return text
+def load_pdf(path, progress=None):
+    return "".join(text for _, text in iter_pdf_pages(path, progress))
 
 
-def build_vectorstore(pdf_path, vectorstore_path=VECTORSTORE_PATH):
-    print(f"Load PDF with PyMuPDF: {pdf_path}")
-    full_text = load_pdf(pdf_path)
+def count_pages(path):
+    with pymupdf.open(path) as doc:
+        return len(doc)
 
-    print("Cut to chunks with better splitting...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""],
+
+def estimate_text_length(path, sample_pages=5):
+    doc = pymupdf.open(path)
+    try:
+        sample = min(sample_pages, len(doc))
+        if not sample:
+            return 0
+        sampled = sum(len(doc[i].get_text("text")) for i in range(sample))
+        return sampled * len(doc) // sample
+    finally:
+        doc.close()
+
+
+def choose_chunk_size(pdf_path):
+    text_length = estimate_text_length(pdf_path)
+    print(f" PDF size: ~{text_length:,} characters")
+
+    if text_length > 5_000_000:
+        print("Using smaller chunk size (400) for large PDF")
+        return 400
+    elif text_length > 2_000_000:
+        print("Using medium chunk size (600) for large PDF")
+        return 600
+    return 800
+
+
+def make_splitter(chunk_size):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_size // 4,
+        separators=SEPARATORS,
         length_function=len,
+        add_start_index=True,
     )
 
-    chunks = splitter.split_text(full_text)
-    print(f"Created {len(chunks)} chunks")
 
-    print("Create embeddings...")
-    embedding = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        model_kwargs={"device": "cpu"}
-    )
+def _split_buffer(splitter, buffer):
+    pieces = []
+    last_start = 0
+    for doc in splitter.create_documents([buffer]):
+        start = doc.metadata["start_index"]
+        if start < 0:
+            start = last_start
+        pieces.append((start, doc.page_content))
+        last_start = start
+    return pieces
 
-    print("Create ChromaDB vectorstore...")
-    if os.path.exists(vectorstore_path):
-        shutil.rmtree(vectorstore_path)
 
-    vectorstore = Chroma.from_texts(
-        texts=chunks,
-        embedding=embedding,
-        persist_directory=vectorstore_path
-    )
+def iter_document_chunks(pdf_path, chunk_size=None, progress=None, start_page=0, end_page=None):
+    if chunk_size is None:
+        chunk_size = choose_chunk_size(pdf_path)
+
+    splitter = make_splitter(chunk_size)
+    source = os.path.basename(pdf_path)
+
+    buffer = ""
+    # (offset in buffer, page number) for every page that starts inside the buffer
+    page_marks = []
+
+    def page_at(offset):
+        i = bisect.bisect_right([mark for mark, _ in page_marks], offset) - 1
+        return page_marks[max(i, 0)][1]
+
+    for page_num, page_text in iter_pdf_pages(pdf_path, progress, start_page, end_page):
+        page_marks.append((len(buffer), page_num))
+        buffer += page_text
+        if len(buffer) < SPLIT_BUFFER_CHUNKS * chunk_size:
+            continue
+
+        pieces = _split_buffer(splitter, buffer)
+        if len(pieces) < 2:
+            continue
+
+        # The last piece may continue on the next page; keep it (and with it the
+        # overlap for the following chunk) in the buffer
+        for start, text in pieces[:-1]:
+            yield Document(page_content=text, metadata={"source": source, "page": page_at(start)})
+
+        keep_from = pieces[-1][0]
+        first_page = page_at(keep_from)
+        page_marks = [(0, first_page)] + [
+            (mark - keep_from, page) for mark, page in page_marks if mark > keep_from
+        ]
+        buffer = buffer[keep_from:]
+
+    if buffer:
+        for start, text in _split_buffer(splitter, buffer):
+            yield Document(page_content=text, metadata={"source": source, "page": page_at(start)})
+
+
+def iter_batches(iterable, size=INGEST_BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
-    os.makedirs(os.path.dirname(vectorstore_path), exist_ok=True)
+def build_vectorstore(pdf_path):
+    # Imported here so page-parsing workers don't load the index or the model
+    from rag.rag_pipeline import RAGPipeline
 
-    print(f"ChromaDB index saved to {vectorstore_path}!")
-    print(
-        f"Documents in collection: {vectorstore._collection.count() if hasattr(vectorstore, '_collection') else 'unknown'}")
+    print(f"Build a fresh index from {pdf_path}")
+    rag = RAGPipeline()
+    rag.reset_index()
+    rag.add_document(pdf_path)
 
-    return vectorstore
+    print(f"Index saved, chunks in collection: {rag.vectorstore.count()}")
+    return rag.vectorstore
 
 
-def build_document_chunks(pdf_path):
+def build_document_chunks(pdf_path, progress=None):
     print(f"Processing PDF: {pdf_path}")
 
     try:
-        full_text = load_pdf(pdf_path)
-
-        text_length = len(full_text)
-        print(f" PDF size: {text_length:,} characters")
-
-        if text_length > 5_000_000:
-            chunk_size = 400
-            print("Using smaller chunk size (400) for large PDF")
-        elif text_length > 2_000_000:
-            chunk_size = 600
-            print("Using medium chunk size (600) for large PDF")
-        else:
-            chunk_size = 800
-
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_size // 4,
-            separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""],
-            length_function=len,
-        )
-
-        chunks = splitter.split_text(full_text)
+        chunks = list(iter_document_chunks(pdf_path, progress=progress))
         print(f"Created {len(chunks)} chunks from {os.path.basename(pdf_path)}")
         return chunks
 
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"Error processing {pdf_path}: {e}")
         return []
@@ -99,4 +167,4 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         build_vectorstore(sys.argv[1])
     else:
-        print("Usage: python build_vectorstore.py <path_to_pdf>")
\ No newline at end of file
+        print("Usage: python build_vectorstore.py <path_to_pdf>")
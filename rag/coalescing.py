@@ -0,0 +1,82 @@
+import asyncio
+
+from rag import metrics
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution and its result.
+    # The work runs in its own task, so a caller that goes away (cancelled
+    # handler) doesn't cancel it for the others.
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def do(self, key, make_coro):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coro())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            metrics.COALESCED_QUERIES.inc(mode=self.name)
+        return await asyncio.shield(task)
+
+
+class _SharedStream:
+    def __init__(self, source):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source):
+        try:
+            async for piece in source:
+                self.pieces.append(piece)
+                self._wake()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._wake()
+
+    async def subscribe(self):
+        # Replays what was produced before this subscriber joined, then follows live
+        position = 0
+        while True:
+            while position < len(self.pieces):
+                yield self.pieces[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamFlight:
+    # SingleFlight for async generators: every caller gets the full stream
+    def __init__(self, name):
+        self.name = name
+        self._streams = {}
+
+    def __contains__(self, key):
+        return key in self._streams
+
+    def stream(self, key, make_stream):
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(make_stream())
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda _: self._streams.pop(key, None))
+        else:
+            metrics.COALESCED_QUERIES.inc(mode=self.name)
+        return shared.subscribe()
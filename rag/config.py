@@ -4,7 +4,86 @@ from dotenv import load_dotenv
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-EMBEDDING_MODEL = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+# Gemini calls: overall deadline per answer, per-attempt timeout, jittered retries on
+# 429/5xx/timeouts, a hedged second request once the first is slower than the model's
+# p95, and a cheaper model used when the primary is failing or would miss the deadline.
+# GEMINI_BASE_URL points the client at another endpoint (benchmarks/gemini_stub_server.py)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", 30))
+GEMINI_ATTEMPT_TIMEOUT = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", 12))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", 4))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", 0.5))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", 4))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "true").lower() == "true"
+GEMINI_HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", 0.95))
+# Hedge delay until enough latencies have been seen to estimate the quantile
+GEMINI_HEDGE_DELAY = float(os.getenv("GEMINI_HEDGE_DELAY", 6))
+# Circuit breaker: open after this many failures in a row, try again after the reset time
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", 5))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", 30))
+EMBEDDING_REFERENCE_MODEL = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", EMBEDDING_REFERENCE_MODEL)
+
+# Embedding engine: "torch" or "onnx" (int8 file below), batch size and an
+# optional multi-process pool used for large ingestion batches only
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx2.onnx")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_POOL_WORKERS = int(os.getenv("EMBEDDING_POOL_WORKERS", 0))
+EMBEDDING_POOL_MIN_TEXTS = int(os.getenv("EMBEDDING_POOL_MIN_TEXTS", 256))
+# Non-torch backends must match the reference model within this cosine distance
+EMBEDDING_VERIFY = os.getenv("EMBEDDING_VERIFY", "true").lower() == "true"
+EMBEDDING_TOLERANCE = float(os.getenv("EMBEDDING_TOLERANCE", 0.02))
+
+# Query path: threads for embedding/search and max questions answered at once
+# (query threads mostly wait for the shared embedding batch, so one per query)
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", 8))
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", 8))
+# Questions arriving within this window are embedded in one batch; recent question vectors are cached
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", 32))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+# Batch mode (python -m rag.batch_qa): questions embedded and searched together, Gemini calls in flight
+BATCH_QA_SIZE = int(os.getenv("BATCH_QA_SIZE", 64))
+BATCH_QA_CONCURRENCY = int(os.getenv("BATCH_QA_CONCURRENCY", 8))
+# Load the embedding model and index in the background when a long-running bot starts
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+# Stream answers into one Telegram message, editing it at most every STREAM_EDIT_INTERVAL seconds
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+# The "Searching the answer..." placeholder is only sent when the answer takes longer than this
+PLACEHOLDER_DELAY = float(os.getenv("PLACEHOLDER_DELAY", 1.5))
+# Outbound Bot API calls are paced per chat (private ~1/s, groups ~20 messages a minute)
+# and globally (~30/s), so a burst waits its turn instead of running into 429 RetryAfter.
+# The rates stay ~10% under Telegram's: calls reach it with jittered latency, and two
+# sent exactly one interval apart can arrive closer together.
+OUTBOUND_GLOBAL_PER_SECOND = float(os.getenv("OUTBOUND_GLOBAL_PER_SECOND", 25))
+OUTBOUND_CHAT_PER_MINUTE = float(os.getenv("OUTBOUND_CHAT_PER_MINUTE", 54))
+OUTBOUND_GROUP_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_PER_MINUTE", 18))
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+# Token buckets in front of the pipeline: per user, and shared (protects the Gemini quota)
+USER_QUESTIONS_PER_MINUTE = float(os.getenv("USER_QUESTIONS_PER_MINUTE", 5))
+USER_QUESTION_BURST = int(os.getenv("USER_QUESTION_BURST", 3))
+GLOBAL_QUESTIONS_PER_MINUTE = float(os.getenv("GLOBAL_QUESTIONS_PER_MINUTE", 30))
+GLOBAL_QUESTION_BURST = int(os.getenv("GLOBAL_QUESTION_BURST", 10))
+
+# Webhook ingress: updates are acknowledged at once and handled by worker tasks
+# from a bounded queue; redeliveries are dropped by update_id
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+WEBHOOK_DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", 10_000))
+# Serverless instances may be frozen after responding, so the Vercel function
+# waits up to this long for the update to finish before acknowledging it
+WEBHOOK_SYNC_WAIT = float(os.getenv("WEBHOOK_SYNC_WAIT", 8))
+
+# Answer cache: exact question match, then nearest cached question above the threshold
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.92))
 
 if os.environ.get('KOYEB'):
     VECTORSTORE_PATH = "/tmp/chroma_db"
@@ -13,5 +92,91 @@ else:
     VECTORSTORE_PATH = "chroma_db"
     DOCS_DIR = "data/documents"
 
+# Vector index backend: "chroma", "flat" (exact NumPy memmap), "hnsw" (hnswlib)
+# or "quantized" (int8/PQ codes in RAM, float32 memmap on disk for re-scoring)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_PATH = VECTORSTORE_PATH if VECTOR_BACKEND == "chroma" else os.path.join(VECTORSTORE_PATH, VECTOR_BACKEND)
+FLAT_DTYPE = os.getenv("FLAT_DTYPE", "float32")
+FLAT_BLOCK_ROWS = int(os.getenv("FLAT_BLOCK_ROWS", 65536))
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+# Quantized backend: QUANT_MODE "int8" (4x smaller) or "pq" (dim / PQ_SUBVECTORS
+# dimensions per byte; must divide the embedding size). The best k * QUANT_RERANK
+# candidates are re-scored with full-precision vectors, 0 turns re-scoring off.
+QUANT_MODE = os.getenv("QUANT_MODE", "int8")
+PQ_SUBVECTORS = int(os.getenv("PQ_SUBVECTORS", 48))
+QUANT_RERANK = int(os.getenv("QUANT_RERANK", 4))
+# Exact search until this many chunks exist, then the quantizer is trained on a sample
+QUANT_TRAIN_SIZE = int(os.getenv("QUANT_TRAIN_SIZE", 2000))
+QUANT_TRAIN_SAMPLE = int(os.getenv("QUANT_TRAIN_SAMPLE", 20000))
+
+MANIFEST_PATH = os.path.join(VECTOR_INDEX_PATH, "manifest.json")
+
+# Hybrid retrieval: BM25 index stored next to the vector store, fused with RRF
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+BM25_INDEX_PATH = f"{VECTORSTORE_PATH.rstrip('/')}_bm25.pkl"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RETRIEVAL_K = 6
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+RRF_K = 60
+
+# Context assembly: collapse overlapping/duplicate hits, pick diverse chunks (MMR),
+# merge neighbours and stop at the token budget (~4 characters per token)
+CONTEXT_ASSEMBLY = os.getenv("CONTEXT_ASSEMBLY", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", 0.97))
+
+# Hierarchical retrieval: questions are routed to the closest documents, then to the
+# closest sections (SECTION_PAGES pages) of those, using centroids of their chunk
+# vectors; only the chosen sections' chunks are searched, one task per document.
+# Corpora with fewer than ROUTING_MIN_DOCUMENTS documents are searched in full.
+# Off by default: up to tens of thousands of chunks a full flat search is faster
+# and finds more (benchmarks/scaling.py).
+HIERARCHICAL_RETRIEVAL = os.getenv("HIERARCHICAL_RETRIEVAL", "false").lower() == "true"
+ROUTING_INDEX_PATH = os.path.join(VECTOR_INDEX_PATH, "routing.pkl")
+SECTION_PAGES = int(os.getenv("SECTION_PAGES", 10))
+ROUTING_DOCUMENTS = int(os.getenv("ROUTING_DOCUMENTS", 4))
+ROUTING_SECTIONS = int(os.getenv("ROUTING_SECTIONS", 8))
+ROUTING_MIN_DOCUMENTS = int(os.getenv("ROUTING_MIN_DOCUMENTS", 3))
+ROUTING_FANOUT_WORKERS = int(os.getenv("ROUTING_FANOUT_WORKERS", 4))
+
+# Chunks embedded and written per batch; bounds ingestion memory
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 512))
+
+# Parallel parsing: worker processes (1 = parse in-process) and pages per task
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", 50))
+
+JOBS_DB_PATH = os.path.join(os.path.dirname(DOCS_DIR), "jobs.sqlite3")
+
+# Bot state shared by all bot processes: admins, pending password prompts, uploaded documents
+STATE_DB_PATH = os.path.join(os.path.dirname(DOCS_DIR), "bot_state.sqlite3")
+ADMINS_JSON_PATH = os.getenv("ADMINS_JSON_PATH", "admins.json")
+PASSWORD_PROMPT_TTL = int(os.getenv("PASSWORD_PROMPT_TTL", 300))
+
+# Document uploads are streamed to disk and hashed as they arrive. The cloud Bot API
+# serves files up to 20 MB; raise MAX_UPLOAD_MB when running a local Bot API server
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", 20))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 256 * 1024))
+UPLOAD_TIMEOUT = int(os.getenv("UPLOAD_TIMEOUT", 120))
+
+# Chunk embedding cache, kept outside VECTORSTORE_PATH so it survives rebuilds
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(DOCS_DIR), "embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100_000))
+
+# Background ingestion: seconds between queue polls / progress writes
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", 2))
+START_INGEST_WORKER = os.getenv("START_INGEST_WORKER", "true").lower() == "true"
+# Seconds between checks of the manifest for index changes made by another process
+INDEX_CHECK_INTERVAL = float(os.getenv("INDEX_CHECK_INTERVAL", 2))
+
+# Metric snapshots from processes without an HTTP endpoint (the ingest worker)
+METRICS_DIR = os.path.join(os.path.dirname(DOCS_DIR), "metrics")
+
 os.makedirs(DOCS_DIR, exist_ok=True)
-os.makedirs(VECTORSTORE_PATH, exist_ok=True)
\ No newline at end of file
+os.makedirs(VECTORSTORE_PATH, exist_ok=True)
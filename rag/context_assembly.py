@@ -0,0 +1,125 @@
+import numpy as np
+
+from rag.config import CONTEXT_TOKEN_BUDGET, MMR_LAMBDA, DUPLICATE_SIMILARITY, RETRIEVAL_K
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English prose and code
+    return (len(text) + 3) // 4
+
+
+def chunk_position(doc):
+    # Chunk ids are "<sha prefix>-<n>"; consecutive n are neighbours in the document
+    prefix, _, index = (doc.id or "").rpartition("-")
+    if not index.isdigit():
+        return doc.id, None
+    return prefix, int(index)
+
+
+def text_overlap(a, b, probe_len=24):
+    # Length of the longest suffix of `a` that is also a prefix of `b`
+    probe = b[:probe_len]
+    start = a.find(probe, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def drop_duplicates(docs, vectors, threshold=DUPLICATE_SIMILARITY):
+    # Keeps the better-ranked of two hits whose text is contained in the other or
+    # whose embeddings are nearly identical (same passage in two PDFs/versions)
+    similarity = vectors @ vectors.T
+    kept = []
+    for i, doc in enumerate(docs):
+        text = doc.page_content
+        if any(
+            text in docs[j].page_content or docs[j].page_content in text or similarity[i, j] >= threshold
+            for j in kept
+        ):
+            continue
+        kept.append(i)
+    return kept
+
+
+def rank_relevance(ranks, total):
+    # Retrieval rank -> relevance in (0, 1]; the fused order already combines the
+    # vector and BM25 rankings, cosine to the question would throw the BM25 side away
+    return 1 - np.asarray(ranks, dtype=np.float32) / max(total, 1)
+
+
+def mmr_order(relevance, vectors, lambda_mult=MMR_LAMBDA):
+    # Maximal marginal relevance: relevance minus similarity to what has already
+    # been picked
+    similarity = vectors @ vectors.T
+    candidates = list(range(len(vectors)))
+    order = []
+    while candidates:
+        scores = lambda_mult * relevance[candidates]
+        if order:
+            scores -= (1 - lambda_mult) * similarity[np.ix_(candidates, order)].max(axis=1)
+        best = candidates[int(np.argmax(scores))]
+        order.append(best)
+        candidates.remove(best)
+    return order
+
+
+def merge_neighbours(docs):
+    # docs in rank order -> texts in rank order, with neighbouring chunks of the same
+    # document joined and their shared overlap written once
+    runs = []
+    by_doc = {}
+    for rank, doc in enumerate(docs):
+        prefix, index = chunk_position(doc)
+        by_doc.setdefault(prefix, []).append((index if index is not None else -1, rank, doc.page_content))
+
+    for chunks in by_doc.values():
+        chunks.sort()
+        current = None
+        for index, rank, text in chunks:
+            overlap = text_overlap(current["text"], text) if current is not None and index >= 0 else 0
+            if overlap or (current is not None and index >= 0 and index == current["index"] + 1):
+                current["text"] += text[overlap:]
+                current["index"] = index
+                current["rank"] = min(current["rank"], rank)
+                continue
+            current = {"index": index, "rank": rank, "text": text}
+            runs.append(current)
+
+    return [run["text"] for run in sorted(runs, key=lambda run: run["rank"])]
+
+
+def assemble_context(docs, vectors, budget=CONTEXT_TOKEN_BUDGET, max_chunks=RETRIEVAL_K):
+    # docs: retrieval candidates in rank order; vectors: {chunk id: vector}
+    if not docs:
+        return ""
+
+    dim = len(next(iter(vectors.values()))) if vectors else 1
+    matrix = _unit([vectors.get(d.id, np.zeros(dim)) for d in docs])
+    kept = drop_duplicates(docs, matrix)
+    relevance = rank_relevance(kept, len(docs))
+    docs = [docs[i] for i in kept]
+    matrix = matrix[kept]
+
+    selected = []
+    texts = []
+    for i in mmr_order(relevance, matrix):
+        if len(selected) == max_chunks:
+            break
+        merged = merge_neighbours(selected + [docs[i]])
+        if estimate_tokens("\n\n".join(merged)) > budget:
+            continue
+        selected.append(docs[i])
+        texts = merged
+
+    if not selected:
+        # Even the best chunk is over budget
+        return docs[0].page_content[:budget * 4]
+    return "\n\n".join(texts)
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag.config import EMBEDDING_MODEL, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+
+INDEX_DTYPE = np.dtype([("key", "S16"), ("slot", "<i4")])
+
+
+# Vectors live in a fixed-capacity float32 memmap; the key -> slot index is kept
+# in LRU order and the least recently used slot is reused once the cache is full.
+# A reused slot is overwritten before the next flush() saves the index, so each
+# slot also stores a checksum of its key and vector; a slot that no longer
+# matches the index entry (crash in between) is treated as a miss.
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_DIR, model_name=EMBEDDING_MODEL,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dim = None
+        self.slots = OrderedDict()
+        self._free = []
+        self._next_slot = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._vectors = None
+        self._checksums = None
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._index_path = os.path.join(path, "index.npy")
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._checksums_path = os.path.join(path, "checksums.bin")
+        self.load()
+
+    def key(self, text):
+        return hashlib.blake2b(
+            f"{self.model_name}\0{text}".encode("utf-8"), digest_size=16
+        ).digest()
+
+    def _checksum(self, key, vector):
+        return hashlib.blake2b(key + np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16).digest()
+
+    def load(self):
+        if not os.path.exists(self._meta_path):
+            return
+
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+
+        if meta.get("model") != self.model_name or meta.get("capacity") != self.max_entries:
+            print("Embedding cache was built for another model/capacity, starting empty")
+            return
+        if not all(os.path.exists(p) for p in (self._index_path, self._vectors_path, self._checksums_path)):
+            # Interrupted first flush, or a cache from before slot checksums
+            print("Embedding cache files are incomplete, starting empty")
+            return
+
+        self.dim = meta["dim"]
+        self._open_vectors("r+")
+        index = np.load(self._index_path)
+        # S16 drops trailing zero bytes, pad keys back to their digest size
+        self.slots = OrderedDict((bytes(row["key"]).ljust(16, b"\0"), int(row["slot"])) for row in index)
+        used = set(self.slots.values())
+        self._next_slot = max(used) + 1 if used else 0
+        self._free = [slot for slot in range(self._next_slot) if slot not in used]
+
+    def _open_vectors(self, mode):
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode=mode,
+            shape=(self.max_entries, self.dim)
+        )
+        self._checksums = np.memmap(self._checksums_path, dtype=np.uint8, mode=mode, shape=(self.max_entries, 16))
+
+    def _take_slot(self):
+        if self._free:
+            return self._free.pop()
+        if self._next_slot < self.max_entries:
+            self._next_slot += 1
+            return self._next_slot - 1
+        _, slot = self.slots.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def get_many(self, texts):
+        results = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                slot = self.slots.get(key)
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+
+                vector = np.array(self._vectors[slot])
+                if self._checksums[slot].tobytes() != self._checksum(key, vector):
+                    # The slot was reused for another text and the index never saved
+                    del self.slots[key]
+                    self._free.append(slot)
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self.slots.move_to_end(key)
+                results.append(vector)
+        return results
+
+    def put_many(self, texts, vectors):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key in self.slots:
+                    continue
+
+                if self._vectors is None:
+                    self.dim = len(vector)
+                    self._open_vectors("w+")
+
+                slot = self._take_slot()
+                self._vectors[slot] = vector
+                self._checksums[slot] = np.frombuffer(self._checksum(key, self._vectors[slot]), dtype=np.uint8)
+                self.slots[key] = slot
+
+    def flush(self):
+        with self._lock:
+            if self._vectors is None:
+                return
+
+            self._vectors.flush()
+            self._checksums.flush()
+            index = np.fromiter(self.slots.items(), dtype=INDEX_DTYPE, count=len(self.slots))
+
+            tmp_index = f"{self._index_path}.tmp.npy"
+            np.save(tmp_index, index)
+            os.replace(tmp_index, self._index_path)
+
+            tmp_meta = f"{self._meta_path}.tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "capacity": self.max_entries}, f)
+            os.replace(tmp_meta, self._meta_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self.slots),
+            "capacity": self.max_entries,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, base, cache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.base.embed_documents(unique)
+            by_text = dict(zip(unique, computed))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+            self.cache.put_many(unique, computed)
+            self.cache.flush()
+
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
@@ -0,0 +1,160 @@
+import argparse
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag.config import (
+    EMBEDDING_MODEL, EMBEDDING_REFERENCE_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_POOL_WORKERS, EMBEDDING_POOL_MIN_TEXTS, EMBEDDING_TOLERANCE,
+)
+
+VERIFY_TEXTS = [
+    "How do I merge two DataFrames on a key column?",
+    "DataFrame.pivot_table(values=None, index=None, columns=None, aggfunc='mean')",
+    "read_csv(filepath_or_buffer, sep=',', dtype=None, parse_dates=False)",
+    "Group rows with groupby and aggregate each group with sum or mean.",
+    "Missing values are represented as NaN and can be filled with fillna.",
+    "Series.str.contains returns a boolean mask for matching strings.",
+]
+
+
+def load_model(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        # Needs optimum[onnxruntime]; EMBEDDING_ONNX_FILE selects e.g. the int8 export
+        return SentenceTransformer(
+            model_name, device="cpu", backend="onnx",
+            model_kwargs={"file_name": EMBEDDING_ONNX_FILE},
+        )
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return SentenceTransformer(model_name, device="cpu")
+
+
+class EmbeddingEngine(Embeddings):
+    def __init__(self, model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND,
+                 batch_size=EMBEDDING_BATCH_SIZE, pool_workers=EMBEDDING_POOL_WORKERS):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.pool_workers = pool_workers
+        self.model = load_model(model_name, backend)
+        self._pool = None
+
+        self.texts_embedded = 0
+        self.embed_seconds = 0.0
+        self.queries_embedded = 0
+        self.query_seconds = 0.0
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = self.model.start_multi_process_pool(["cpu"] * self.pool_workers)
+        return self._pool
+
+    def encode(self, texts):
+        # Only bulk ingestion is worth the inter-process overhead of the pool
+        if self.pool_workers > 1 and len(texts) >= EMBEDDING_POOL_MIN_TEXTS:
+            return self.model.encode_multi_process(texts, self._get_pool(), batch_size=self.batch_size)
+        return self.model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+        )
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        started = time.perf_counter()
+        vectors = self.encode(list(texts))
+        self.embed_seconds += time.perf_counter() - started
+        self.texts_embedded += len(texts)
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        started = time.perf_counter()
+        vector = self.encode([text])[0]
+        self.query_seconds += time.perf_counter() - started
+        self.queries_embedded += 1
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def embed_queries(self, texts):
+        # Several questions in one forward pass; counted as queries, not ingestion
+        started = time.perf_counter()
+        vectors = self.encode(list(texts))
+        self.query_seconds += time.perf_counter() - started
+        self.queries_embedded += len(texts)
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "texts_embedded": self.texts_embedded,
+            "texts_per_second": self.texts_embedded / self.embed_seconds if self.embed_seconds else 0.0,
+            "queries_embedded": self.queries_embedded,
+            "query_ms": 1000 * self.query_seconds / self.queries_embedded if self.queries_embedded else 0.0,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+def verify_embeddings(engine, reference, texts=VERIFY_TEXTS, tolerance=EMBEDDING_TOLERANCE):
+    # Cosine similarity of every vector against the reference backend must stay above 1 - tolerance
+    ours = np.asarray(engine.embed_documents(texts))
+    theirs = np.asarray(reference.embed_documents(texts))
+    ours /= np.linalg.norm(ours, axis=1, keepdims=True)
+    theirs /= np.linalg.norm(theirs, axis=1, keepdims=True)
+    worst = float(np.min(np.sum(ours * theirs, axis=1)))
+    return worst >= 1 - tolerance, worst
+
+
+def export_quantized_onnx(output_dir, quantization="avx2", model_name=EMBEDDING_REFERENCE_MODEL):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save(output_dir)
+    export_dynamic_quantized_onnx_model(model, quantization, output_dir)
+    print(f"Saved int8 model to {output_dir}/onnx/model_qint8_{quantization}.onnx")
+
+
+def benchmark(engine, n_texts=2000, n_queries=50):
+    texts = [f"{VERIFY_TEXTS[i % len(VERIFY_TEXTS)]} ({i})" for i in range(n_texts)]
+
+    started = time.perf_counter()
+    engine.embed_documents(texts)
+    bulk = time.perf_counter() - started
+
+    latencies = []
+    for i in range(n_queries):
+        started = time.perf_counter()
+        engine.embed_query(texts[i])
+        latencies.append(time.perf_counter() - started)
+
+    print(
+        f"{engine.backend}: {n_texts / bulk:.1f} chunks/s, "
+        f"query p50 {1000 * float(np.median(latencies)):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding engine tools")
+    parser.add_argument("command", choices=["verify", "benchmark", "export-onnx"])
+    parser.add_argument("--output", default="models/minilm-onnx", help="export-onnx output directory")
+    parser.add_argument("--quantization", default="avx2", help="arm64, avx2, avx512 or avx512_vnni")
+    args = parser.parse_args()
+
+    if args.command == "export-onnx":
+        export_quantized_onnx(args.output, args.quantization)
+    elif args.command == "verify":
+        ok, worst = verify_embeddings(
+            EmbeddingEngine(), EmbeddingEngine(model_name=EMBEDDING_REFERENCE_MODEL, backend="torch")
+        )
+        print(f"{'OK' if ok else 'FAILED'}: worst cosine similarity {worst:.4f} (tolerance {EMBEDDING_TOLERANCE})")
+    else:
+        engine = EmbeddingEngine()
+        try:
+            benchmark(engine)
+        finally:
+            engine.close()
@@ -0,0 +1,44 @@
+from rag.config import EMBEDDING_MODEL, EMBEDDING_REFERENCE_MODEL, EMBEDDING_BACKEND, EMBEDDING_CACHE_ENABLED, EMBEDDING_VERIFY
+from rag.embedding_cache import EmbeddingCache, CachedEmbeddings
+from rag.embedding_engine import EmbeddingEngine, verify_embeddings
+
+
+def create_engine():
+    engine = EmbeddingEngine()
+    if engine.backend == "torch" or not EMBEDDING_VERIFY:
+        return engine
+
+    reference = EmbeddingEngine(model_name=EMBEDDING_REFERENCE_MODEL, backend="torch")
+    ok, worst = verify_embeddings(engine, reference)
+    if ok:
+        return engine
+
+    print(f"{engine.backend} embeddings drift from the reference model (cosine {worst:.4f}), using torch")
+    return reference
+
+
+def create_embeddings():
+    embedding = create_engine()
+    if not EMBEDDING_CACHE_ENABLED:
+        return embedding
+
+    # Vectors from different backends are close but not identical, keep them apart
+    namespace = EMBEDDING_MODEL if embedding.backend == "torch" else f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}"
+    return CachedEmbeddings(embedding, EmbeddingCache(model_name=namespace))
+
+
+def print_embedding_stats(embedding):
+    if isinstance(embedding, CachedEmbeddings):
+        stats = embedding.cache.stats()
+        print(
+            f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['size']}/{stats['capacity']} entries"
+        )
+        embedding = embedding.base
+
+    if isinstance(embedding, EmbeddingEngine):
+        stats = embedding.stats()
+        print(
+            f"Embedding engine ({stats['backend']}): {stats['texts_embedded']} chunks "
+            f"at {stats['texts_per_second']:.1f} chunks/s"
+        )
@@ -0,0 +1,289 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from rag import metrics
+from rag.config import (
+    GEMINI_MODEL, GEMINI_FALLBACK_MODEL, GEMINI_DEADLINE, GEMINI_ATTEMPT_TIMEOUT, GEMINI_MAX_ATTEMPTS,
+    GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, GEMINI_HEDGE, GEMINI_HEDGE_QUANTILE, GEMINI_HEDGE_DELAY,
+    GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET,
+)
+
+# Rate limits, overload and transient server errors; anything else (bad request,
+# auth, safety block) fails the same way on every attempt
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+class GeminiUnavailable(Exception):
+    pass
+
+
+class GeminiDeadlineExceeded(GeminiUnavailable):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in RETRYABLE_CODES:
+        return True
+    # Transport failures inside google-genai surface as httpx/aiohttp exceptions
+    return type(error).__module__.split(".")[0] in ("httpx", "aiohttp")
+
+
+def backoff(attempt, base=GEMINI_BACKOFF_BASE, cap=GEMINI_BACKOFF_MAX):
+    # Full jitter: concurrent callers that failed together don't retry together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LatencyWindow:
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            if len(self._samples) < LATENCY_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    # Closed -> open after `failures` retryable failures in a row. While open,
+    # requests skip the model; after `reset` seconds one probe is let through and
+    # its outcome closes or re-opens the circuit.
+    def __init__(self, name, failures=GEMINI_BREAKER_FAILURES, reset=GEMINI_BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._probing = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                metrics.GEMINI_CIRCUIT_OPEN.set(0, model=self.name)
+                print(f"Gemini circuit for {self.name} closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or (self._opened_at is None and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                metrics.GEMINI_CIRCUIT_OPEN.set(1, model=self.name)
+                print(f"Gemini circuit for {self.name} opened after {self._consecutive} failures")
+            self._probing = False
+
+    def release(self):
+        # The probe was cancelled (lost a hedge race) without an outcome
+        with self._lock:
+            self._probing = False
+
+
+class GeminiClient:
+    # Policy layer around a google-genai client: every call gets a deadline and
+    # is retried with jittered backoff on retryable errors. A request slower than
+    # the model's p95 is hedged with a second one, first result wins. Models are
+    # tried in order, skipping those whose circuit is open or whose p95 no longer
+    # fits in the remaining time; a retry goes to a model that hasn't failed yet.
+    def __init__(self, get_client, models=None, deadline=GEMINI_DEADLINE, attempt_timeout=GEMINI_ATTEMPT_TIMEOUT,
+                 max_attempts=GEMINI_MAX_ATTEMPTS, hedge=GEMINI_HEDGE, hedge_quantile=GEMINI_HEDGE_QUANTILE,
+                 hedge_delay=GEMINI_HEDGE_DELAY):
+        self.get_client = get_client
+        self.models = models or [m for m in (GEMINI_MODEL, GEMINI_FALLBACK_MODEL) if m]
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.breakers = {model: CircuitBreaker(model) for model in self.models}
+        self.latency = {model: LatencyWindow() for model in self.models}
+        # Blocking calls for generate_sync(); not the loop's default executor, so
+        # asyncio.run() doesn't wait for a hedge that lost
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
+
+    def _pick_model(self, remaining, failed=()):
+        # Models that already failed this call go last, so a retry moves on to the fallback
+        order = [m for m in self.models if m not in failed] + [m for m in self.models if m in failed]
+        fallback = None
+        for model in order:
+            if not self.breakers[model].allow():
+                continue
+            p95 = self.latency[model].quantile(self.hedge_quantile)
+            if p95 is None or p95 < remaining or model == order[-1]:
+                if fallback is not None:
+                    self.breakers[fallback].release()
+                return model
+            # Deadline at risk on this model; keep it in case nothing else is available
+            if fallback is None:
+                fallback = model
+            else:
+                self.breakers[model].release()
+        return fallback
+
+    def _config(self, timeout):
+        return {"http_options": {"timeout": int(timeout * 1000)}}
+
+    def _request(self, model, contents, timeout, blocking):
+        client = self.get_client()
+        if blocking:
+            loop = asyncio.get_running_loop()
+            return loop.run_in_executor(
+                self._executor,
+                lambda: client.models.generate_content(model=model, contents=contents, config=self._config(timeout)),
+            )
+        return client.aio.models.generate_content(model=model, contents=contents, config=self._config(timeout))
+
+    async def _attempt(self, model, make_call, timeout, record_latency=True):
+        breaker = self.breakers[model]
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(make_call(), timeout)
+        except asyncio.CancelledError:
+            breaker.release()
+            metrics.GEMINI_ATTEMPTS.inc(model=model, result="cancelled")
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            metrics.GEMINI_ATTEMPTS.inc(model=model, result=type(e).__name__)
+            raise
+
+        breaker.record_success()
+        if record_latency:
+            self.latency[model].add(time.perf_counter() - started)
+        metrics.GEMINI_ATTEMPTS.inc(model=model, result="ok")
+        return result
+
+    async def _hedged(self, model, contents, expires, blocking):
+        def start(name):
+            timeout = min(self.attempt_timeout, expires - time.monotonic())
+            return asyncio.ensure_future(
+                self._attempt(name, lambda: self._request(name, contents, timeout, blocking), timeout)
+            )
+
+        tasks = {start(model)}
+        try:
+            delay = self.latency[model].quantile(self.hedge_quantile) or self.hedge_delay
+            if self.hedge and delay < expires - time.monotonic():
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    hedge_model = self._pick_model(expires - time.monotonic())
+                    if hedge_model is not None:
+                        metrics.GEMINI_HEDGES.inc(model=hedge_model)
+                        tasks.add(start(hedge_model))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _with_retries(self, run, deadline):
+        # run(model, expires) is one (possibly hedged) attempt
+        expires = time.monotonic() + (deadline or self.deadline)
+        last_error = None
+        failed = set()
+        for attempt in range(self.max_attempts):
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+            model = self._pick_model(remaining, failed)
+            if model is None:
+                raise GeminiUnavailable("Every Gemini model's circuit breaker is open") from last_error
+            try:
+                return await run(model, expires)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                failed.add(model)
+                print(f"Gemini attempt {attempt + 1} on {model} failed: {type(e).__name__}: {e}")
+
+            delay = backoff(attempt)
+            if time.monotonic() + delay >= expires:
+                break
+            await asyncio.sleep(delay)
+        raise GeminiDeadlineExceeded(
+            f"No Gemini answer within {deadline or self.deadline:.0f}s ({type(last_error).__name__})"
+        ) from last_error
+
+    async def generate(self, contents, deadline=None, blocking=False):
+        return await self._with_retries(
+            lambda model, expires: self._hedged(model, contents, expires, blocking), deadline
+        )
+
+    def generate_sync(self, contents, deadline=None):
+        # For threads without an event loop (the sync query path)
+        return asyncio.run(self.generate(contents, deadline, blocking=True))
+
+    async def _open_stream(self, model, contents, expires):
+        # Retries and fallback only apply until the first chunk: after that the
+        # user has seen text and a second answer can't be spliced in
+        async def first_chunk():
+            stream = await self.get_client().aio.models.generate_content_stream(
+                model=model, contents=contents, config=self._config(expires - time.monotonic())
+            )
+            iterator = stream.__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+
+        timeout = min(self.attempt_timeout, expires - time.monotonic())
+        return await self._attempt(model, first_chunk, timeout, record_latency=False)
+
+    async def stream(self, contents, deadline=None):
+        expires = time.monotonic() + (deadline or self.deadline)
+        iterator, chunk = await self._with_retries(
+            lambda model, attempt_expires: self._open_stream(model, contents, attempt_expires), deadline
+        )
+        while chunk is not None:
+            yield chunk
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise GeminiDeadlineExceeded("Gemini stream passed its deadline")
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise GeminiDeadlineExceeded("Gemini stream passed its deadline")
@@ -1,3 +1,41 @@
-from rag.rag_pipeline import RAGPipeline
+import threading
+import time
 
-rag = RAGPipeline()
+from rag.timing import StageTimings
+
+# Phases of bringing this instance up (imports, bot setup, model and index
+# loading), reported by /health and /warmup
+startup_timings = StageTimings()
+
+_rag = None
+_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+_started = time.perf_counter()
+
+
+def get_rag():
+    global _rag
+    if _rag is None:
+        with _lock:
+            if _rag is None:
+                with startup_timings.measure("pipeline_import"):
+                    from rag.rag_pipeline import RAGPipeline
+
+                    _rag = RAGPipeline()
+    return _rag
+
+
+def warmup():
+    with _warmup_lock:
+        rag = get_rag()
+        if not rag.is_warm:
+            rag.warmup(startup_timings)
+    return startup_status()
+
+
+def startup_status():
+    return {
+        "warm": _rag is not None and _rag.is_warm,
+        "uptime_seconds": round(time.perf_counter() - _started, 1),
+        "phases": {stage: round(seconds, 3) for stage, (seconds, _) in startup_timings.stages.items()},
+    }
@@ -0,0 +1,75 @@
+import atexit
+import multiprocessing
+import time
+import traceback
+
+from rag.config import JOB_POLL_INTERVAL
+from rag.jobs import (
+    JobProgress, JobCancelled, claim_next_job, finish_job, requeue_stale_jobs,
+    DONE, FAILED, CANCELLED,
+)
+
+
+def run_job(rag, job):
+    progress = JobProgress(job["id"])
+    kind = job["kind"]
+    payload = job["payload"]
+
+    if kind == "add_document":
+        success = rag.add_document(payload["path"], progress=progress, sha256=payload.get("sha256"))
+    elif kind == "remove_document":
+        success = rag.remove_document(payload["filename"])
+    elif kind == "rebuild_index":
+        success = rag.rebuild_index(progress=progress)
+    else:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    return success, progress.counters
+
+
+def main(poll_interval=JOB_POLL_INTERVAL):
+    from rag import metrics
+    from rag.rag_pipeline import RAGPipeline
+
+    stale = requeue_stale_jobs()
+    if stale:
+        print(f"Requeued {stale} interrupted jobs")
+
+    rag = RAGPipeline()
+    print("Ingest worker started")
+
+    while True:
+        job = claim_next_job()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"Running job {job['id']} ({job['kind']})")
+        try:
+            success, counters = run_job(rag, job)
+            if success:
+                finish_job(job["id"], DONE, progress=counters)
+            else:
+                finish_job(job["id"], FAILED, progress=counters, error="Processing failed")
+        except JobCancelled:
+            print(f"Job {job['id']} cancelled")
+            finish_job(job["id"], CANCELLED)
+        except Exception as e:
+            traceback.print_exc()
+            finish_job(job["id"], FAILED, error=str(e))
+
+        # The bot serves /metrics and adds this process' snapshot to its own
+        metrics.save_snapshot()
+
+
+def start_worker_process():
+    # spawn: the child must not inherit the bot's event loop or loaded model
+    ctx = multiprocessing.get_context("spawn")
+    process = ctx.Process(target=main, name="ingest-worker")
+    process.start()
+    atexit.register(process.terminate)
+    return process
+
+
+if __name__ == "__main__":
+    main()
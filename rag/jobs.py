@@ -0,0 +1,178 @@
+import json
+import sqlite3
+import time
+
+from rag.config import JOBS_DB_PATH, JOB_PROGRESS_INTERVAL
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _connect():
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress TEXT NOT NULL DEFAULT '{}',
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    """)
+    return conn
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["progress"] = json.loads(job["progress"])
+    return job
+
+
+def enqueue_job(kind, payload=None):
+    with _connect() as conn:
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, payload, status, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload or {}), QUEUED, time.time())
+        )
+        return cur.lastrowid
+
+
+def get_job(job_id):
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def list_jobs(limit=10, active_only=False):
+    query = "SELECT * FROM jobs"
+    params = []
+    if active_only:
+        query += " WHERE status IN (?, ?)"
+        params.extend(ACTIVE_STATUSES)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+
+    with _connect() as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def cancel_job(job_id):
+    with _connect() as conn:
+        # Queued jobs are cancelled right away, running ones at their next progress update
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED)
+        )
+        if cur.rowcount:
+            return True
+        cur = conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+            (job_id, RUNNING)
+        )
+        return cur.rowcount > 0
+
+
+def claim_next_job():
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+            (RUNNING, time.time(), row["id"])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    job = _row_to_job(row)
+    job["status"] = RUNNING
+    return job
+
+
+def update_progress(job_id, progress):
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET progress = ? WHERE id = ?",
+            (json.dumps(progress), job_id)
+        )
+        row = conn.execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    return bool(row and row["cancel_requested"])
+
+
+def finish_job(job_id, status, progress=None, error=None):
+    with _connect() as conn:
+        if progress is None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, progress = ?, finished_at = ? WHERE id = ?",
+                (status, error, json.dumps(progress), time.time(), job_id)
+            )
+
+
+def requeue_stale_jobs():
+    # A job left "running" means the previous worker died mid-way
+    with _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+            (QUEUED, RUNNING)
+        )
+        return cur.rowcount
+
+
+class JobProgress:
+    def __init__(self, job_id, interval=JOB_PROGRESS_INTERVAL):
+        self.job_id = job_id
+        self.interval = interval
+        self.counters = {}
+        self._last_flush = 0.0
+
+    def update(self, **deltas):
+        for key, value in deltas.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.interval:
+            self.flush()
+
+    def set(self, **values):
+        self.counters.update(values)
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if update_progress(self.job_id, self.counters):
+            raise JobCancelled(f"Job {self.job_id} cancelled")
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+
+from rag.config import MANIFEST_PATH
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(sha256, index):
+    return f"{sha256[:16]}-{index}"
+
+
+class DocumentManifest:
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.documents = {}
+        self.version = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.documents = {}
+            self.version = 0
+            return
+
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        self.documents = data.get("documents", {})
+        self.version = data.get("version", 0)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.version, "documents": self.documents}, f)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, sha256):
+        return sha256 in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def get(self, sha256):
+        return self.documents.get(sha256)
+
+    def find_by_source(self, source):
+        for sha256, entry in self.documents.items():
+            if entry["source"] == source:
+                return sha256, entry
+        return None, None
+
+    def chunk_ids(self, sha256):
+        return [chunk["id"] for chunk in self.documents[sha256]["chunks"]]
+
+    def add(self, sha256, source, chunks):
+        self.documents[sha256] = {"source": source, "chunks": chunks}
+        self.version += 1
+
+    def rename(self, sha256, source):
+        self.documents[sha256]["source"] = source
+
+    def remove(self, sha256):
+        entry = self.documents.pop(sha256, None)
+        if entry is not None:
+            self.version += 1
+        return entry
+
+    def clear(self):
+        self.documents = {}
+        self.version += 1
@@ -0,0 +1,247 @@
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from rag.config import METRICS_DIR
+from rag.jobs import JobCancelled
+
+# Dependency-free counters and histograms rendered in the Prometheus text format.
+# Each update is a dict lookup under a lock, cheap enough to leave on. Processes
+# without an HTTP endpoint (the ingest worker) save snapshots to METRICS_DIR and
+# the bot adds them to its own values when /metrics is scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+INGEST_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+_lock = threading.Lock()
+_metrics = []
+
+
+def _labels_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def state(self):
+        with _lock:
+            return [[list(key), json.loads(json.dumps(value))] for key, value in self._values.items()]
+
+    def reset(self):
+        with _lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels_text(self.labels, key)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with _lock:
+            value = self._values.get(key)
+            if value is None:
+                # Per-bucket (not cumulative) counts, +Inf last, then sum and count
+                value = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            value[0][index] += 1
+            value[1] += seconds
+            value[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return [list(value[0]), value[1], value[2]]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def render(self, values):
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels_text(self.labels, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels_text(self.labels, key)} {total}"
+            yield f"{self.name}_count{_labels_text(self.labels, key)} {count}"
+
+
+def _snapshot_path(pid=None):
+    return os.path.join(METRICS_DIR, f"{pid or os.getpid()}.json")
+
+
+def save_snapshot():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({metric.name: metric.state() for metric in _metrics}, f)
+    os.replace(tmp_path, path)
+
+
+def _load_snapshots():
+    own = _snapshot_path()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        if path == own:
+            continue
+        try:
+            with open(path, "r") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_prometheus():
+    snapshots = _load_snapshots()
+    lines = []
+    for metric in _metrics:
+        values = {}
+        for key, value in metric.state() + [item for s in snapshots for item in s.get(metric.name, [])]:
+            key = tuple(key)
+            values[key] = metric.merge(values.get(key), value)
+
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render(values))
+    return "\n".join(lines) + "\n"
+
+
+QUERIES = Counter("rag_queries_total", "Questions received", ["mode"])
+QUERY_SECONDS = Histogram("rag_query_seconds", "Question latency by stage", ["stage"])
+ANSWER_CACHE_HITS = Counter("rag_answer_cache_hits_total", "Answers served from the answer cache", ["kind"])
+COALESCED_QUERIES = Counter("rag_coalesced_queries_total", "Questions that joined an identical in-flight question",
+                            ["mode"])
+RATE_LIMITED = Counter("bot_rate_limited_total", "Questions turned away by the rate limiter", ["scope"])
+QUERY_EMBEDDING_BATCH = Histogram("rag_query_embedding_batch_size", "Questions encoded per forward pass",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64))
+QUERY_EMBEDDING_CACHE_HITS = Counter("rag_query_embedding_cache_hits_total", "Question vectors served from the LRU")
+QUERIES_WITHOUT_DOCUMENTS = Counter("rag_queries_without_documents_total",
+                                    "Questions asked before anything was indexed")
+PROMPT_TOKENS = Histogram("rag_prompt_tokens", "Estimated prompt tokens, top-k join vs assembled context", ["context"],
+                          buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000))
+
+INGEST_SECONDS = Histogram("rag_ingest_seconds", "add_document / rebuild_index duration", ["operation", "result"],
+                           buckets=INGEST_BUCKETS)
+INGEST_STAGE_SECONDS = Counter("rag_ingest_stage_seconds_total", "Time spent per ingestion stage", ["stage"])
+PAGES_PARSED = Counter("rag_pages_parsed_total", "PDF pages parsed")
+CHUNKS_INGESTED = Counter("rag_chunks_ingested_total", "Chunks embedded and written to the index")
+
+GEMINI_SECONDS = Histogram("gemini_request_seconds", "Gemini call latency", ["mode"])
+GEMINI_ERRORS = Counter("gemini_errors_total", "Failed Gemini calls", ["mode", "error"])
+GEMINI_TOKENS = Counter("gemini_tokens_total", "Tokens reported by Gemini usage metadata", ["kind"])
+GEMINI_ATTEMPTS = Counter("gemini_attempts_total", "Individual Gemini requests by model and outcome",
+                          ["model", "result"])
+GEMINI_HEDGES = Counter("gemini_hedged_requests_total", "Second requests sent because the first was slow", ["model"])
+GEMINI_CIRCUIT_OPEN = Gauge("gemini_circuit_open", "1 while the model's circuit breaker is open", ["model"])
+
+WEBHOOK_UPDATES = Counter("webhook_updates_total", "Webhook updates by outcome", ["result"])
+WEBHOOK_QUEUE_DEPTH = Gauge("webhook_queue_depth", "Updates waiting for a worker")
+WEBHOOK_QUEUE_WAIT = Histogram("webhook_queue_wait_seconds", "Time an update waited in the queue")
+WEBHOOK_UPDATE_SECONDS = Histogram("webhook_update_seconds", "Time to handle one update")
+UPLOADS = Counter("bot_uploads_total", "Document uploads by outcome", ["result"])
+UPLOAD_BYTES = Counter("bot_upload_bytes_total", "Bytes downloaded from Telegram for uploads")
+OUTBOUND_REQUESTS = Counter("bot_outbound_requests_total", "Bot API calls to chats by method and outcome",
+                            ["method", "result"])
+OUTBOUND_WAIT = Histogram("bot_outbound_wait_seconds", "Time a Bot API call waited for its turn")
+OUTBOUND_QUEUE_DEPTH = Gauge("bot_outbound_queue_depth", "Bot API calls waiting for their turn")
+
+
+def record_gemini_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    GEMINI_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+    GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, kind="output")
+
+
+def record_ingest_timings(timings):
+    for stage, (seconds, _) in timings.stages.items():
+        INGEST_STAGE_SECONDS.inc(seconds, stage=stage)
+    PAGES_PARSED.inc(timings.stages.get("parse", (0, 0))[1])
+    CHUNKS_INGESTED.inc(timings.stages.get("write", (0, 0))[1])
+
+
+@contextmanager
+def count_errors(counter, **labels):
+    try:
+        yield
+    except Exception as e:
+        counter.inc(error=type(e).__name__, **labels)
+        raise
+
+
+def track_ingest(operation):
+    # Times an ingestion method; result is ok/failed from its return value
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = "error"
+            try:
+                success = func(*args, **kwargs)
+                result = "ok" if success else "failed"
+                return success
+            except JobCancelled:
+                result = "cancelled"
+                raise
+            finally:
+                INGEST_SECONDS.observe(time.perf_counter() - started, operation=operation, result=result)
+        return wrapper
+    return decorator
@@ -0,0 +1,98 @@
+import atexit
+import itertools
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pymupdf
+
+from rag.build_vectorstore import iter_document_chunks, choose_chunk_size
+from rag.config import INGEST_WORKERS, PAGES_PER_TASK
+
+# Spawning workers and importing PyMuPDF in them costs ~1s, so one pool serves
+# every job of the process (the ingest worker) instead of one pool per document
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers=INGEST_WORKERS):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def plan_tasks(pdf_paths, pages_per_task=PAGES_PER_TASK):
+    # Large PDFs are cut into page ranges so several workers can share them;
+    # chunk size is decided once per document so every range splits the same way
+    tasks = []
+    for path in pdf_paths:
+        try:
+            with pymupdf.open(path) as doc:
+                page_count = len(doc)
+            chunk_size = choose_chunk_size(path)
+        except Exception as e:
+            print(f"Error opening {path}: {e}")
+            continue
+        for start in range(0, max(page_count, 1), pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, page_count), chunk_size))
+    return tasks
+
+
+def parse_range(task):
+    path, start, end, chunk_size = task
+    started = time.perf_counter()
+    try:
+        chunks = [
+            (chunk.page_content, chunk.metadata["page"])
+            for chunk in iter_document_chunks(path, chunk_size, start_page=start, end_page=end)
+        ]
+        return chunks, end - start, time.perf_counter() - started, None
+    except Exception as e:
+        return None, end - start, time.perf_counter() - started, str(e)
+
+
+def iter_parsed_ranges(tasks, workers=INGEST_WORKERS):
+    # Results are yielded in task order; only a small window of ranges is in
+    # flight so finished-but-unconsumed chunks can't pile up in memory
+    pool = get_pool(workers)
+    tasks = iter(tasks)
+    pending = deque()
+    try:
+        for task in itertools.islice(tasks, workers * 2):
+            pending.append((task, pool.submit(parse_range, task)))
+
+        while pending:
+            task, future = pending.popleft()
+            result = future.result()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append((next_task, pool.submit(parse_range, next_task)))
+            yield task, result
+    except BrokenProcessPool:
+        # A worker died (out of memory, killed); the next job starts a new pool
+        shutdown_pool()
+        raise
+    finally:
+        # Stopped early (cancelled job, failed document): the pool stays for the next job
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,139 @@
+import numpy as np
+
+# Rows encoded / scored per step, bounds the float32 temporaries
+ENCODE_BLOCK_ROWS = 16384
+
+
+class ScalarQuantizer:
+    # One byte per dimension: each dimension's [min, max] over the training
+    # vectors is split into 256 steps
+    kind = "int8"
+
+    def __init__(self):
+        self.low = None
+        self.step = None
+
+    @property
+    def code_size(self):
+        return len(self.low)
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.low = vectors.min(axis=0)
+        self.step = np.maximum((vectors.max(axis=0) - self.low) / 255, 1e-8)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return np.clip(np.rint((vectors - self.low) / self.step), 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return self.low + codes.astype(np.float32) * self.step
+
+    def distances(self, queries, codes, norms):
+        # ||x||^2 - 2 q.x with x = low + step * code; the ||q||^2 term doesn't change the order
+        dots = (queries @ self.low)[:, None] + (queries * self.step) @ codes.T.astype(np.float32)
+        return norms[None, :] - 2 * dots
+
+    def state(self):
+        return {"low": self.low, "step": self.step}
+
+    def load_state(self, state):
+        self.low = state["low"]
+        self.step = state["step"]
+
+
+def kmeans(vectors, k, iterations=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    vector_norms = np.einsum("ij,ij->i", vectors, vectors)
+    for _ in range(iterations):
+        dist = vector_norms[:, None] - 2 * vectors @ centroids.T + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        assignment = dist.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class ProductQuantizer:
+    # The vector is cut into `subvectors` slices; each slice is replaced by the
+    # index of its nearest of 256 k-means centroids, so a chunk costs
+    # `subvectors` bytes. Search uses per-query lookup tables (ADC).
+    kind = "pq"
+    centroids_per_slice = 256
+
+    def __init__(self, subvectors):
+        self.subvectors = subvectors
+        self.codebooks = None
+
+    @property
+    def code_size(self):
+        return self.subvectors
+
+    def _slices(self, vectors):
+        n, dim = vectors.shape
+        return vectors.reshape(n, self.subvectors, dim // self.subvectors)
+
+    def train(self, vectors, iterations=20, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % self.subvectors:
+            raise ValueError(f"PQ_SUBVECTORS={self.subvectors} doesn't divide the {vectors.shape[1]} dimensions")
+        if len(vectors) < self.centroids_per_slice:
+            raise ValueError(f"Product quantization needs at least {self.centroids_per_slice} training vectors")
+        slices = self._slices(vectors)
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(slices[:, m]), self.centroids_per_slice, iterations, seed + m)
+            for m in range(self.subvectors)
+        ])
+
+    def encode(self, vectors):
+        slices = self._slices(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(slices), self.subvectors), dtype=np.uint8)
+        for m, codebook in enumerate(self.codebooks):
+            part = slices[:, m]
+            dist = np.einsum("ij,ij->i", codebook, codebook)[None, :] - 2 * part @ codebook.T
+            codes[:, m] = dist.argmin(axis=1)
+        return codes
+
+    def decode(self, codes):
+        parts = [self.codebooks[m][codes[:, m]] for m in range(self.subvectors)]
+        return np.concatenate(parts, axis=1)
+
+    def distances(self, queries, codes, norms):
+        # Squared L2 to the reconstructed vectors: sum of one table lookup per slice
+        slices = self._slices(queries)
+        result = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        # One contiguous code column per slice makes the lookups several times faster
+        columns = np.ascontiguousarray(codes.T)
+        for i, query in enumerate(slices):
+            tables = ((self.codebooks - query[:, None, :]) ** 2).sum(axis=2)
+            for m in range(self.subvectors):
+                result[i] += np.take(tables[m], columns[m])
+        return result
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state):
+        self.codebooks = state["codebooks"]
+        self.subvectors = len(self.codebooks)
+
+
+def create_quantizer(mode, subvectors):
+    if mode == "int8":
+        return ScalarQuantizer()
+    if mode == "pq":
+        return ProductQuantizer(subvectors)
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def encode_blocks(quantizer, vectors, start, end):
+    # Codes for rows [start, end) of a (memmapped) vector matrix
+    codes = np.empty((end - start, quantizer.code_size), dtype=np.uint8)
+    for i in range(start, end, ENCODE_BLOCK_ROWS):
+        j = min(i + ENCODE_BLOCK_ROWS, end)
+        codes[i - start:j - start] = quantizer.encode(np.asarray(vectors[i:j], dtype=np.float32))
+    return codes
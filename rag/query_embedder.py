@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+
+from rag import metrics
+from rag.config import QUERY_BATCH_WINDOW_MS, QUERY_BATCH_MAX, QUERY_EMBEDDING_CACHE_SIZE
+from rag.embedding_cache import CachedEmbeddings
+
+
+class _Request:
+    def __init__(self):
+        self.done = threading.Event()
+        self.vector = None
+        self.error = None
+
+
+class QueryEmbedder:
+    # Embeds questions arriving from several query threads in one forward pass.
+    # The first thread to find no batch being collected becomes the leader: it
+    # waits up to `window_ms` (or until `max_batch` questions are pending),
+    # encodes them together and hands each caller its vector. Recent question
+    # vectors are kept in an LRU.
+    def __init__(self, embedding, window_ms=QUERY_BATCH_WINDOW_MS, max_batch=QUERY_BATCH_MAX,
+                 cache_size=QUERY_EMBEDDING_CACHE_SIZE):
+        # Question vectors don't belong in the on-disk chunk cache
+        self.embedding = embedding.base if isinstance(embedding, CachedEmbeddings) else embedding
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = OrderedDict()
+        self._collecting = False
+        self._cond = threading.Condition()
+
+    def _encode(self, texts):
+        if hasattr(self.embedding, "embed_queries"):
+            return self.embedding.embed_queries(texts)
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = text.strip()
+        with self._cond:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                metrics.QUERY_EMBEDDING_CACHE_HITS.inc()
+                return vector
+
+            # The same question twice in one window is encoded once
+            request = self._pending.get(key)
+            if request is None:
+                request = self._pending[key] = _Request()
+                if len(self._pending) >= self.max_batch:
+                    self._cond.notify_all()
+
+            leader = not self._collecting
+            if leader:
+                self._collecting = True
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._collecting = False
+
+        if leader:
+            self._run_batch(batch)
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vector
+
+    def _run_batch(self, batch):
+        texts = list(batch)
+        metrics.QUERY_EMBEDDING_BATCH.observe(len(texts))
+        try:
+            vectors = self._encode(texts)
+        except Exception as e:
+            for request in batch.values():
+                request.error = e
+                request.done.set()
+            return
+
+        self._remember(texts, vectors)
+        for request, vector in zip(batch.values(), vectors):
+            request.vector = vector
+            request.done.set()
+
+    def _remember(self, texts, vectors):
+        with self._cond:
+            for text, vector in zip(texts, vectors):
+                self._cache[text] = vector
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed_queries(self, texts):
+        # A whole list of questions (batch mode): no window to wait for, the
+        # uncached ones are encoded in one call
+        keys = [text.strip() for text in texts]
+        with self._cond:
+            found = {key: self._cache[key] for key in keys if key in self._cache}
+        if found:
+            metrics.QUERY_EMBEDDING_CACHE_HITS.inc(sum(key in found for key in keys))
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            metrics.QUERY_EMBEDDING_BATCH.observe(len(missing))
+            vectors = self._encode(missing)
+            self._remember(missing, vectors)
+            found.update(zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    def clear(self):
+        with self._cond:
+            self._cache.clear()
@@ -1,16 +1,51 @@
 import os
-from google import genai
-from langchain_chroma import Chroma  
-from langchain_huggingface import HuggingFaceEmbeddings
-from rag.config import GEMINI_API_KEY, VECTORSTORE_PATH, DOCS_DIR, EMBEDDING_MODEL
-from rag.build_vectorstore import build_vectorstore
-from rag.build_vectorstore import build_document_chunks
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from rag import metrics
+from rag.config import GEMINI_API_KEY, GEMINI_BASE_URL, DOCS_DIR
+from rag.config import INGEST_BATCH_SIZE, INGEST_WORKERS, QUERY_WORKERS, MAX_CONCURRENT_QUERIES, ANSWER_CACHE_ENABLED
+from rag.config import VECTOR_BACKEND, HYBRID_RETRIEVAL, RETRIEVAL_K, RETRIEVAL_CANDIDATES, RRF_K, CONTEXT_ASSEMBLY
+from rag.config import HIERARCHICAL_RETRIEVAL, ROUTING_MIN_DOCUMENTS, ROUTING_FANOUT_WORKERS
+from rag.config import INDEX_CHECK_INTERVAL
+from rag.answer_cache import AnswerCache, normalize_question
+from rag.bm25_index import BM25Index, reciprocal_rank_fusion
+from rag.coalescing import SingleFlight, StreamFlight
+from rag.context_assembly import assemble_context, estimate_tokens
+from rag.gemini_client import GeminiClient
+from rag.embeddings import create_embeddings, print_embedding_stats
+from rag.jobs import JobCancelled
+from rag.manifest import DocumentManifest, file_sha256, chunk_id
+from rag.query_embedder import QueryEmbedder
+from rag.routing import RoutingIndex, SectionAccumulator
+from rag.timing import StageTimings
+from rag.vector_index import create_vector_index
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+_client = None
+_client_lock = threading.Lock()
 
 
-def ask_gemini(prompt, context):
-    full_prompt = f"""
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+
+                http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+                _client = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
+    return _client
+
+
+# Deadlines, retries, hedging, model fallback and circuit breaking for every Gemini call
+gemini = GeminiClient(get_client)
+
+
+def build_prompt(prompt, context):
+    return f"""
 You are a pandas documentation assistant. Use ONLY the context below to answer.
 
 CONTEXT:
@@ -32,32 +67,152 @@ STRICT RULES:
 ANSWER:
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[full_prompt]
-    )
+
+def ask_gemini(prompt, context):
+    with metrics.GEMINI_SECONDS.time(mode="sync"), metrics.count_errors(metrics.GEMINI_ERRORS, mode="sync"):
+        response = gemini.generate_sync([build_prompt(prompt, context)])
+    metrics.record_gemini_usage(response)
     return response.text
 
 
+async def ask_gemini_async(prompt, context):
+    with metrics.GEMINI_SECONDS.time(mode="async"), metrics.count_errors(metrics.GEMINI_ERRORS, mode="async"):
+        response = await gemini.generate([build_prompt(prompt, context)])
+    metrics.record_gemini_usage(response)
+    return response.text
+
+
+
+async def ask_gemini_stream(prompt, context):
+    started = time.perf_counter()
+    last = None
+    with metrics.GEMINI_SECONDS.time(mode="stream"), metrics.count_errors(metrics.GEMINI_ERRORS, mode="stream"):
+        async for chunk in gemini.stream([build_prompt(prompt, context)]):
+            if last is None:
+                metrics.GEMINI_SECONDS.observe(time.perf_counter() - started, mode="stream_first_chunk")
+            last = chunk
+            if chunk.text:
+                yield chunk.text
+    # Usage metadata is complete on the final chunk
+    metrics.record_gemini_usage(last)
+
+
+NO_DOCUMENTS = "No documents available. Please upload a document first."
+
+
 class RAGPipeline:
+    # Construction is cheap: the embedding model, the index and the Gemini client
+    # are loaded on first use (or by warmup()) so importing the bot stays fast
     def __init__(self):
         self.vectorstore = None
-        self.embedding = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={"device": "cpu"}
-        )
-        self.load_vectorstore()
+        self.bm25 = BM25Index()
+        self.routing = RoutingIndex()
+        self.hierarchical = HIERARCHICAL_RETRIEVAL
+        self._embedding = None
+        self._query_embedder = None
+        self._loaded = False
+        self._load_lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="rag-query")
+        # Separate pool: the fan-out is started from query threads
+        self._fanout_executor = ThreadPoolExecutor(max_workers=ROUTING_FANOUT_WORKERS, thread_name_prefix="rag-route")
+        self._query_semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+        self.manifest = DocumentManifest()
+        # (mtime, size) of the manifest file as of the last load, see reload_if_changed()
+        self._manifest_stamp = None
+        self._next_index_check = 0.0
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+        # Identical questions asked at the same time share one embed + search + Gemini call
+        self._query_flight = SingleFlight("async")
+        self._stream_flight = StreamFlight("stream")
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            with self._load_lock:
+                if self._embedding is None:
+                    self._embedding = create_embeddings()
+        return self._embedding
+
+    @property
+    def query_embedder(self):
+        if self._query_embedder is None:
+            embedding = self.embedding
+            with self._load_lock:
+                if self._query_embedder is None:
+                    self._query_embedder = QueryEmbedder(embedding)
+        return self._query_embedder
+
+    @property
+    def is_warm(self):
+        return self._loaded and self._embedding is not None and _client is not None
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.load_vectorstore()
+
+    def warmup(self, timings=None):
+        timings = timings or StageTimings()
+        with timings.measure("vector_index"):
+            self.ensure_loaded()
+        with timings.measure("embedding_model"):
+            # The first call also pays for kernel/graph initialisation
+            self.query_embedder.embed_query("warmup")
+        with timings.measure("genai_client"):
+            get_client()
+        return timings
+
+    def _read_manifest_stamp(self):
+        try:
+            stat = os.stat(self.manifest.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self, force=False):
+        # Ingestion jobs write the index from the worker process and save the
+        # manifest last, so a new manifest version means the whole index changed.
+        # Checked at most every INDEX_CHECK_INTERVAL seconds; force skips the wait.
+        now = time.monotonic()
+        if not force and now < self._next_index_check:
+            return False
+        self._next_index_check = now + INDEX_CHECK_INTERVAL
+        stamp = self._read_manifest_stamp()
+        if stamp == self._manifest_stamp:
+            return False
+
+        with self._load_lock:
+            stamp = self._read_manifest_stamp()
+            if stamp == self._manifest_stamp:
+                return False
+            on_disk = DocumentManifest(self.manifest.path)
+            if on_disk.version == self.manifest.version:
+                # Saved by this process, or only a rename
+                self._manifest_stamp = stamp
+                return False
+            print(f"Index changed on disk (version {self.manifest.version} -> {on_disk.version}), reloading")
+            self.load_vectorstore()
+            return True
 
     def load_vectorstore(self):
+        self._loaded = True
+        # Taken before reading, so a save that races the load is seen by the next check
+        self._manifest_stamp = self._read_manifest_stamp()
+        manifest = DocumentManifest(self.manifest.path)
+        # Swap in a fresh index so concurrent queries never see a half-loaded one
+        bm25 = BM25Index()
+        bm25.load()
+        self.bm25 = bm25
+        routing = RoutingIndex()
+        routing.load()
+        self.routing = routing
         try:
-            self.vectorstore = Chroma(
-                persist_directory=VECTORSTORE_PATH,
-                embedding_function=self.embedding
-            )
-            print("VectorStore loaded successfully")
+            self.vectorstore = create_vector_index()
+            print(f"VectorStore ({VECTOR_BACKEND}) loaded successfully")
 
             try:
-                count = self.vectorstore._collection.count()
+                count = self.vectorstore.count()
                 print(f"Documents in collection: {count}")
             except:
                 print("Could not get document count")
@@ -66,88 +221,472 @@ class RAGPipeline:
             print(f"Error loading VectorStore: {e}")
             self.vectorstore = None
 
+        # Last: a query that sees the new version also searches the new index
+        self.manifest = manifest
+        if self.answer_cache is not None:
+            self.answer_cache.validate(manifest.version)
+            self.answer_cache.clear()
+
     def rebuild_from_pdf(self, pdf_path):
         try:
-            self.vectorstore = build_vectorstore(pdf_path, VECTORSTORE_PATH)
+            self.reset_index()
+            if not self.add_document(pdf_path):
+                return False
             print("VectorStore rebuilt successfully from new PDF")
             return True
         except Exception as e:
             print(f"Error rebuilding VectorStore: {e}")
             return False
 
-    def rebuild_index(self):
+    @metrics.track_ingest("rebuild_index")
+    def rebuild_index(self, progress=None):
         try:
             pdf_files = [f for f in os.listdir(DOCS_DIR) if f.endswith('.pdf')]
+            current = {}
+            for pdf_file in pdf_files:
+                current[file_sha256(os.path.join(DOCS_DIR, pdf_file))] = pdf_file
+
+            self._ensure_vectorstore()
+
+            # Vectors written before the manifest existed can't be attributed to a file
+            if not len(self.manifest) and self.vectorstore.count():
+                print("Index has no manifest, resetting collection")
+                self.reset_index()
+
+            self._backfill_bm25()
+            self._backfill_routing()
+
+            stale = [sha for sha in self.manifest.documents if sha not in current]
+            for sha in stale:
+                self._delete_document(sha)
 
             if not pdf_files:
                 print("No PDF files found")
                 return False
 
-            all_chunks = []
-            for pdf_file in pdf_files:
-                pdf_path = os.path.join(DOCS_DIR, pdf_file)
-                chunks = build_document_chunks(pdf_path)
-                all_chunks.extend(chunks)
-
-            import shutil
-            if os.path.exists(VECTORSTORE_PATH):
-                shutil.rmtree(VECTORSTORE_PATH)
-
-            self.vectorstore = Chroma.from_texts(
-                texts=all_chunks,
-                embedding=self.embedding,
-                persist_directory=VECTORSTORE_PATH
-            )
+            to_index = []
+            unchanged = 0
+            for sha, pdf_file in current.items():
+                entry = self.manifest.get(sha)
+                if entry is None:
+                    to_index.append((sha, os.path.join(DOCS_DIR, pdf_file)))
+                else:
+                    unchanged += 1
+                    if entry["source"] != pdf_file:
+                        self.manifest.rename(sha, pdf_file)
+                        self.manifest.save()
 
-            print(f"Index rebuilt with {len(pdf_files)} documents, {len(all_chunks)} total chunks")
+            added = len(self._index_documents(to_index, progress))
+            self.vectorstore.compact()
+
+            print(
+                f"Index rebuilt with {len(current)} documents: "
+                f"{added} embedded, {len(stale)} removed, {unchanged} unchanged"
+            )
+            print_embedding_stats(self.embedding)
             return True
 
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error rebuilding index: {e}")
             return False
 
-    def query(self, question):
+    def _use_routing(self, routing):
+        # Until rebuild_index()/add_document() backfill it, the routing index may miss older documents
+        return self.hierarchical and len(routing) >= max(ROUTING_MIN_DOCUMENTS, len(self.manifest))
+
+    def search(self, vector, k):
+        # Vector search, restricted to the routed documents/sections on larger corpora
+        routing = self.routing
+        if not self._use_routing(routing):
+            return self.vectorstore.search(vector, k)
+
+        with metrics.QUERY_SECONDS.time(stage="route"):
+            routed = routing.route(vector)
+        if sum(len(ids) for ids in routed.values()) < k:
+            return self.vectorstore.search(vector, k)
+
+        groups = list(routed.values())
+        if len(groups) == 1:
+            hits = self.vectorstore.search_within(vector, groups[0], k)
+        else:
+            futures = [self._fanout_executor.submit(self.vectorstore.search_within, vector, ids, k) for ids in groups]
+            hits = sorted(hit for future in futures for hit in future.result())[:k]
+
+        docs = {d.id: d for d in self.vectorstore.get([chunk_id for _, chunk_id in hits])}
+        return [docs[chunk_id] for _, chunk_id in hits if chunk_id in docs]
+
+    def search_batch(self, vectors, k):
+        # One vectorized index search for many questions; routed search is per question
+        if self._use_routing(self.routing):
+            return [self.search(vector, k) for vector in vectors]
+        return self.vectorstore.search_batch(vectors, k)
+
+    def retrieve(self, question, vector, k=RETRIEVAL_K):
+        bm25 = self.bm25
+        if not HYBRID_RETRIEVAL or not len(bm25):
+            return self.search(vector, k)
+        return self._fuse(bm25, question, self.search(vector, RETRIEVAL_CANDIDATES), k)
+
+    def retrieve_batch(self, questions, vectors, k=RETRIEVAL_K):
+        bm25 = self.bm25
+        if not HYBRID_RETRIEVAL or not len(bm25):
+            return self.search_batch(vectors, k)
+        hits = self.search_batch(vectors, RETRIEVAL_CANDIDATES)
+        return [self._fuse(bm25, question, vector_docs, k) for question, vector_docs in zip(questions, hits)]
+
+    def _fuse(self, bm25, question, vector_docs, k):
+        # BM25 still ranks the whole corpus, which recovers hits in sections the router skipped
+        lexical_ids = bm25.search(question, RETRIEVAL_CANDIDATES)
+        fused = reciprocal_rank_fusion([[d.id for d in vector_docs], lexical_ids], k=RRF_K)[:k]
+
+        docs_by_id = {d.id: d for d in vector_docs}
+        missing = [chunk_id for chunk_id in fused if chunk_id not in docs_by_id]
+        if missing:
+            docs_by_id.update((d.id, d) for d in self.vectorstore.get(missing))
+        return [docs_by_id[chunk_id] for chunk_id in fused if chunk_id in docs_by_id]
+
+    @property
+    def context_candidates(self):
+        # How many retrieved chunks build_context() expects
+        return RETRIEVAL_CANDIDATES if CONTEXT_ASSEMBLY else RETRIEVAL_K
+
+    def retrieve_context(self, question, vector):
+        return self.build_context(question, self.retrieve(question, vector, self.context_candidates))
+
+    def build_context(self, question, candidates):
+        if not CONTEXT_ASSEMBLY:
+            return "\n\n".join([d.page_content for d in candidates])
+
+        vectors = self.vectorstore.get_vectors([d.id for d in candidates])
+        context = assemble_context(candidates, vectors)
+
+        # What the top-k join used to send, for comparison
+        naive = "\n\n".join(d.page_content for d in candidates[:RETRIEVAL_K])
+        metrics.PROMPT_TOKENS.observe(estimate_tokens(build_prompt(question, naive)), context="top_k")
+        metrics.PROMPT_TOKENS.observe(estimate_tokens(build_prompt(question, context)), context="assembled")
+        return context
+
+    def _prepare_answer(self, question):
+        # Returns (cached answer, question vector, context, index version); context is
+        # only built on a miss, the version goes back to _remember_answer()
+        self.ensure_loaded()
+        self.reload_if_changed()
+        version = self.manifest.version
         if not self.vectorstore:
-            return "No documents available. Please upload a document first."
+            metrics.QUERIES_WITHOUT_DOCUMENTS.inc()
+            return NO_DOCUMENTS, None, None, version
 
-        docs = self.vectorstore.similarity_search(question, k=6)
-        context = "\n\n".join([d.page_content for d in docs])
-        return ask_gemini(question, context)
+        if self.answer_cache is not None:
+            self.answer_cache.validate(version)
+            answer = self.answer_cache.get_exact(question)
+            if answer is not None:
+                metrics.ANSWER_CACHE_HITS.inc(kind="exact")
+                return answer, None, None, version
 
-    def add_document(self, pdf_path):
-        try:
-            new_chunks = build_document_chunks(pdf_path)
+        with metrics.QUERY_SECONDS.time(stage="embed"):
+            vector = self.query_embedder.embed_query(question)
 
-            if not new_chunks:
-                return False
+        if self.answer_cache is not None:
+            answer = self.answer_cache.get_similar(vector)
+            if answer is not None:
+                metrics.ANSWER_CACHE_HITS.inc(kind="semantic")
+                return answer, vector, None, version
+
+        with metrics.QUERY_SECONDS.time(stage="search"):
+            context = self.retrieve_context(question, vector)
+        return None, vector, context, version
+
+    def _remember_answer(self, question, vector, answer, version):
+        if self.answer_cache is not None:
+            self.answer_cache.put(question, vector, answer, version)
+
+    def query(self, question):
+        metrics.QUERIES.inc(mode="sync")
+        with metrics.QUERY_SECONDS.time(stage="total"):
+            answer, vector, context, version = self._prepare_answer(question)
+            if answer is not None:
+                return answer
+
+            with metrics.QUERY_SECONDS.time(stage="generate"):
+                answer = ask_gemini(question, context)
+            self._remember_answer(question, vector, answer, version)
+            return answer
+
+    def is_in_flight(self, question):
+        key = normalize_question(question)
+        return key in self._query_flight or key in self._stream_flight
+
+    async def aquery(self, question):
+        metrics.QUERIES.inc(mode="async")
+        return await self._query_flight.do(normalize_question(question), lambda: self._aquery(question))
+
+    async def _aquery(self, question):
+        # Loading the index, embedding and vector search are CPU-bound, keep them off the event loop
+        async with self._query_semaphore:
+            with metrics.QUERY_SECONDS.time(stage="total"):
+                loop = asyncio.get_running_loop()
+                answer, vector, context, version = await loop.run_in_executor(
+                    self._executor, self._prepare_answer, question
+                )
+                if answer is not None:
+                    return answer
+
+                with metrics.QUERY_SECONDS.time(stage="generate"):
+                    answer = await ask_gemini_async(question, context)
+                self._remember_answer(question, vector, answer, version)
+                return answer
+
+    def astream(self, question):
+        # Same as aquery() but yields the answer piece by piece as Gemini writes it
+        metrics.QUERIES.inc(mode="stream")
+        return self._stream_flight.stream(normalize_question(question), lambda: self._astream(question))
 
-            BATCH_SIZE = 4000
+    async def _astream(self, question):
+        async with self._query_semaphore:
+            with metrics.QUERY_SECONDS.time(stage="total"):
+                loop = asyncio.get_running_loop()
+                answer, vector, context, version = await loop.run_in_executor(
+                    self._executor, self._prepare_answer, question
+                )
+                if answer is not None:
+                    yield answer
+                    return
+
+                pieces = []
+                with metrics.QUERY_SECONDS.time(stage="generate"):
+                    async for piece in ask_gemini_stream(question, context):
+                        pieces.append(piece)
+                        yield piece
+                self._remember_answer(question, vector, "".join(pieces), version)
+
+    def _ensure_vectorstore(self):
+        self.ensure_loaded()
+        if self.vectorstore is None:
+            self.vectorstore = create_vector_index()
+
+    def reset_index(self):
+        self._ensure_vectorstore()
+        self.vectorstore.reset()
+        self.manifest.clear()
+        self.manifest.save()
+        self.bm25.clear()
+        self.bm25.save()
+        self.routing.clear()
+        self.routing.save()
+
+    def _write_batch(self, ids, batch, timings):
+        texts = [c.page_content for c in batch]
+        with timings.measure("embed", len(batch)):
+            vectors = self.embedding.embed_documents(texts)
+        with timings.measure("write", len(batch)):
+            self.vectorstore.add(ids, vectors, texts, [c.metadata for c in batch])
+            self.bm25.add(ids, texts)
+        return vectors
+
+    def _index_chunks(self, sha, pdf_path, chunks, progress, timings):
+        from rag.build_vectorstore import iter_batches
+
+        source = os.path.basename(pdf_path)
+        written_ids = []
+        manifest_chunks = []
+        sections = SectionAccumulator()
+        batches = 0
 
-            if self.vectorstore is None:
-                import shutil
-                if os.path.exists(VECTORSTORE_PATH):
-                    shutil.rmtree(VECTORSTORE_PATH)
+        try:
+            for batch in iter_batches(chunks):
+                ids = [chunk_id(sha, len(written_ids) + i) for i in range(len(batch))]
+                for chunk in batch:
+                    chunk.metadata["doc_id"] = sha
 
-                first_batch = new_chunks[:BATCH_SIZE]
-                self.vectorstore = Chroma.from_texts(
-                    texts=first_batch,
-                    embedding=self.embedding,
-                    persist_directory=VECTORSTORE_PATH
+                written_ids.extend(ids)
+                vectors = self._write_batch(ids, batch, timings)
+                sections.add(ids, vectors, [chunk.metadata["page"] for chunk in batch])
+                manifest_chunks.extend(
+                    {"id": cid, "page": chunk.metadata["page"]}
+                    for cid, chunk in zip(ids, batch)
                 )
 
-                for i in range(BATCH_SIZE, len(new_chunks), BATCH_SIZE):
-                    batch = new_chunks[i:i + BATCH_SIZE]
-                    self.vectorstore.add_texts(batch)
-                    print(f"Added batch {i // BATCH_SIZE + 1}")
-            else:
-                for i in range(0, len(new_chunks), BATCH_SIZE):
-                    batch = new_chunks[i:i + BATCH_SIZE]
-                    self.vectorstore.add_texts(batch)
-                    print(f"Added batch {i // BATCH_SIZE + 1}")
-
-            print(f"Document added in {((len(new_chunks) - 1) // BATCH_SIZE + 1)} batches")
+                batches += 1
+                print(f"Added batch {batches}")
+                if progress:
+                    progress.update(chunks_embedded=len(batch), batches_written=1)
+        except BaseException:
+            # Don't leave half a document behind on cancel/failure
+            for i in range(0, len(written_ids), INGEST_BATCH_SIZE):
+                self.vectorstore.delete(written_ids[i:i + INGEST_BATCH_SIZE])
+            self.bm25.remove(written_ids)
+            raise
+
+        if not manifest_chunks:
+            return 0
+
+        # Vectors are durable before the manifest says the document is indexed
+        self.vectorstore.persist()
+        self.bm25.save()
+        self.routing.add(sha, sections)
+        self.routing.save()
+        self.manifest.add(sha, source, manifest_chunks)
+        self.manifest.save()
+        print(f"Created {len(manifest_chunks)} chunks from {source}")
+        return batches
+
+    def _sequential_chunk_streams(self, docs, timings, progress):
+        # PyMuPDF and the text splitters are only needed for ingestion
+        from rag.build_vectorstore import iter_document_chunks, count_pages
+
+        for sha, pdf_path in docs:
+            print(f"Processing PDF: {pdf_path}")
+            timings.add("parse", 0.0, count_pages(pdf_path))
+            chunks = iter_document_chunks(pdf_path, progress=progress)
+            yield sha, pdf_path, timings.timed_iter("parse", chunks)
+
+    def _parallel_chunk_streams(self, docs, tasks, timings, progress):
+        from rag.parallel_ingest import iter_parsed_ranges
+
+        sha_by_path = {pdf_path: sha for sha, pdf_path in docs}
+        ranges = iter_parsed_ranges(tasks)
+
+        def range_chunks(pdf_path, group):
+            source = os.path.basename(pdf_path)
+            for _, (chunks, pages, seconds, error) in group:
+                if error:
+                    raise RuntimeError(error)
+                timings.add("parse", seconds, pages)
+                if progress:
+                    progress.update(pages_parsed=pages)
+                for text, page in chunks:
+                    yield Document(page_content=text, metadata={"source": source, "page": page})
+
+        for pdf_path, group in itertools.groupby(ranges, key=lambda r: r[0][0]):
+            print(f"Processing PDF: {pdf_path}")
+            yield sha_by_path[pdf_path], pdf_path, range_chunks(pdf_path, group)
+
+    def _index_documents(self, docs, progress=None, timings=None):
+        # docs: [(sha256, pdf_path)]; returns the shas that were indexed
+        if not docs:
+            return []
+
+        timings = timings or StageTimings()
+        started = time.perf_counter()
+
+        tasks = []
+        if INGEST_WORKERS > 1:
+            from rag.parallel_ingest import plan_tasks
+
+            tasks = plan_tasks([pdf_path for _, pdf_path in docs])
+        # A single page range (one small PDF) is parsed faster here than shipped to a worker
+        if len(tasks) > 1:
+            streams = self._parallel_chunk_streams(docs, tasks, timings, progress)
+        else:
+            streams = self._sequential_chunk_streams(docs, timings, progress)
+
+        indexed = []
+        for sha, pdf_path, chunks in streams:
+            try:
+                if self._index_chunks(sha, pdf_path, chunks, progress, timings):
+                    indexed.append(sha)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"Error processing {pdf_path}: {e}")
+
+        print(f"Ingestion timings ({INGEST_WORKERS} workers): {timings.report(time.perf_counter() - started)}")
+        metrics.record_ingest_timings(timings)
+        return indexed
+
+    def _backfill_bm25(self):
+        # Documents indexed before BM25 existed (or after its file was lost)
+        missing = [
+            sha for sha, entry in self.manifest.documents.items()
+            if entry["chunks"] and entry["chunks"][0]["id"] not in self.bm25
+        ]
+        for sha in missing:
+            ids = self.manifest.chunk_ids(sha)
+            for i in range(0, len(ids), INGEST_BATCH_SIZE):
+                docs = self.vectorstore.get(ids[i:i + INGEST_BATCH_SIZE])
+                self.bm25.add([d.id for d in docs], [d.page_content for d in docs])
+        if missing:
+            self.bm25.save()
+            print(f"Added {len(missing)} documents to the BM25 index")
+
+    def _backfill_routing(self):
+        # Documents indexed before the routing level existed
+        missing = [sha for sha in self.manifest.documents if sha not in self.routing]
+        for sha in missing:
+            chunks = self.manifest.get(sha)["chunks"]
+            sections = SectionAccumulator()
+            for i in range(0, len(chunks), INGEST_BATCH_SIZE):
+                batch = chunks[i:i + INGEST_BATCH_SIZE]
+                found = self.vectorstore.get_vectors([c["id"] for c in batch])
+                batch = [c for c in batch if c["id"] in found]
+                sections.add([c["id"] for c in batch], [found[c["id"]] for c in batch], [c["page"] for c in batch])
+            self.routing.add(sha, sections)
+        if missing:
+            self.routing.save()
+            print(f"Added {len(missing)} documents to the routing index")
+
+    def _delete_document(self, sha):
+        ids = self.manifest.chunk_ids(sha)
+        for i in range(0, len(ids), INGEST_BATCH_SIZE):
+            self.vectorstore.delete(ids[i:i + INGEST_BATCH_SIZE])
+        self.vectorstore.persist()
+        self.bm25.remove(ids)
+        self.bm25.save()
+        self.routing.remove(sha)
+        self.routing.save()
+        entry = self.manifest.remove(sha)
+        self.manifest.save()
+        print(f"Removed {len(ids)} chunks of {entry['source']}")
+
+    @metrics.track_ingest("add_document")
+    def add_document(self, pdf_path, progress=None, sha256=None):
+        # sha256: digest computed while the upload was received, saves reading the file again
+        try:
+            source = os.path.basename(pdf_path)
+            sha = sha256 or file_sha256(pdf_path)
+            self._ensure_vectorstore()
+
+            if sha in self.manifest:
+                self.manifest.rename(sha, source)
+                self.manifest.save()
+                print(f"{source} is already indexed")
+                return True
+
+            # Same file name with new content replaces the old version
+            old_sha, _ = self.manifest.find_by_source(source)
+            if old_sha is not None:
+                self._delete_document(old_sha)
+
+            self._backfill_routing()
+
+            if not self._index_documents([(sha, pdf_path)], progress):
+                return False
+
+            print(f"Document added: {source}")
+            print_embedding_stats(self.embedding)
             return True
 
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error adding document: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @metrics.track_ingest("remove_document")
+    def remove_document(self, filename):
+        try:
+            self.ensure_loaded()
+            sha, _ = self.manifest.find_by_source(filename)
+            if sha is None:
+                print(f"{filename} is not indexed")
+                return True
+
+            self._ensure_vectorstore()
+            self._delete_document(sha)
+            return True
+
+        except Exception as e:
+            print(f"Error removing document: {e}")
+            return False
@@ -0,0 +1,144 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from rag.config import ROUTING_INDEX_PATH, SECTION_PAGES, ROUTING_DOCUMENTS, ROUTING_SECTIONS
+
+
+def section_of(page, section_pages=SECTION_PAGES):
+    return (max(page, 1) - 1) // section_pages
+
+
+class SectionAccumulator:
+    # Running per-section vector sums while a document's chunks are written
+    def __init__(self, section_pages=SECTION_PAGES):
+        self.section_pages = section_pages
+        self.sections = {}
+
+    def add(self, ids, vectors, pages):
+        for chunk_id, vector, page in zip(ids, np.asarray(vectors, dtype=np.float32), pages):
+            section = section_of(page, self.section_pages)
+            entry = self.sections.get(section)
+            if entry is None:
+                entry = self.sections[section] = [np.zeros_like(vector), []]
+            entry[0] += vector
+            entry[1].append(chunk_id)
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class RoutingIndex:
+    # Coarse level above the chunk index: one centroid per document and per
+    # section (SECTION_PAGES pages), each section knowing its chunk ids. A
+    # question is matched against documents first, then against the sections of
+    # the best documents, and only those sections' chunks are searched.
+    def __init__(self, path=ROUTING_INDEX_PATH, section_pages=SECTION_PAGES):
+        self.path = path
+        self.section_pages = section_pages
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # sha -> {section: (vector sum, chunk ids)}
+        self.documents = {}
+        self._matrices = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, sha):
+        return sha in self.documents
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.clear()
+            return
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state["section_pages"] != self.section_pages:
+            # Sections were cut differently, rebuild_index() backfills them
+            print(f"Routing index uses {state['section_pages']} pages per section, rebuilding")
+            self.clear()
+            return
+        self.documents = state["documents"]
+        self._matrices = None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"section_pages": self.section_pages, "documents": self.documents},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, self.path)
+
+    def add(self, sha, accumulator):
+        sections = {section: (total, ids) for section, (total, ids) in accumulator.sections.items()}
+        with self._lock:
+            self.documents = {**self.documents, sha: sections}
+            self._matrices = None
+
+    def remove(self, sha):
+        with self._lock:
+            if sha in self.documents:
+                self.documents = {k: v for k, v in self.documents.items() if k != sha}
+                self._matrices = None
+
+    def _build(self):
+        # add()/remove() replace self.documents, so the snapshot keeps a consistent copy
+        documents = self.documents
+        doc_keys, doc_sums = [], []
+        section_keys, section_sums, section_docs = [], [], []
+        for sha, sections in documents.items():
+            if not sections:
+                continue
+            doc_keys.append(sha)
+            doc_sums.append(sum(total for total, _ in sections.values()))
+            for section, (total, _) in sorted(sections.items()):
+                section_keys.append((sha, section))
+                section_sums.append(total)
+                section_docs.append(len(doc_keys) - 1)
+        if not doc_keys:
+            return None
+        return (
+            documents, doc_keys, _unit_rows(np.stack(doc_sums)),
+            section_keys, _unit_rows(np.stack(section_sums)), np.asarray(section_docs),
+        )
+
+    def _snapshot(self):
+        matrices = self._matrices
+        if matrices is None:
+            with self._lock:
+                if self._matrices is None:
+                    self._matrices = self._build()
+                matrices = self._matrices
+        return matrices
+
+    def route(self, vector, n_documents=ROUTING_DOCUMENTS, n_sections=ROUTING_SECTIONS):
+        # Returns {sha: [chunk ids of the chosen sections]}, best document first
+        matrices = self._snapshot()
+        if matrices is None:
+            return {}
+        documents, doc_keys, doc_matrix, section_keys, section_matrix, section_docs = matrices
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        doc_scores = doc_matrix @ query
+        top_docs = np.argsort(-doc_scores)[:n_documents]
+
+        candidates = np.flatnonzero(np.isin(section_docs, top_docs))
+        section_scores = section_matrix[candidates] @ query
+        chosen = candidates[np.argsort(-section_scores)[:n_sections]]
+
+        routed = {doc_keys[d]: [] for d in top_docs}
+        for s in chosen:
+            sha, section = section_keys[s]
+            routed[sha].extend(documents[sha][section][1])
+        return {sha: ids for sha, ids in routed.items() if ids}
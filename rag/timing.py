@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+
+STAGE_UNITS = {
+    "parse": "pages",
+    "embed": "chunks",
+    "write": "chunks",
+}
+
+
+class StageTimings:
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds, items=0):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += items
+
+    @contextmanager
+    def measure(self, stage, items=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, items)
+
+    def timed_iter(self, stage, iterable):
+        # Charges the time spent producing each item (e.g. parsing) to `stage`
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started)
+                return
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def report(self, wall_seconds=None):
+        lines = []
+        for stage, (seconds, items) in self.stages.items():
+            line = f"{stage}: {seconds:.2f}s"
+            if items:
+                line += f", {items} {STAGE_UNITS.get(stage, 'items')} ({items / seconds if seconds else 0:.1f}/s)"
+            lines.append(line)
+        if wall_seconds is not None:
+            lines.append(f"wall: {wall_seconds:.2f}s")
+        return " | ".join(lines)
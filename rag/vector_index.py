@@ -0,0 +1,843 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag.config import (
+    VECTORSTORE_PATH, VECTOR_BACKEND, FLAT_DTYPE, FLAT_BLOCK_ROWS,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    QUANT_MODE, PQ_SUBVECTORS, QUANT_RERANK, QUANT_TRAIN_SIZE, QUANT_TRAIN_SAMPLE,
+)
+from rag.quantization import create_quantizer, encode_blocks
+
+# Tombstoned rows are compacted away once they pass this share of the index
+COMPACT_RATIO = 0.25
+# Int8 codes are widened to float32 per block while scoring; keep that temporary small
+QUANT_BLOCK_ROWS = 8192
+
+
+class VectorIndex:
+    def count(self):
+        raise NotImplementedError
+
+    def add(self, ids, vectors, texts, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def search(self, vector, k):
+        return self.search_batch([vector], k)[0]
+
+    def search_batch(self, vectors, k):
+        raise NotImplementedError
+
+    def get(self, ids):
+        raise NotImplementedError
+
+    def get_vectors(self, ids):
+        # {id: float32 vector} for the ids that exist
+        raise NotImplementedError
+
+    def search_within(self, vector, ids, k):
+        # Nearest of the given chunks only, as [(distance, id)]; distances are
+        # comparable between calls on the same index
+        found = self.get_vectors(ids)
+        if not found:
+            return []
+        keys = list(found)
+        matrix = np.stack([found[key] for key in keys])
+        dist = np.einsum("ij,ij->i", matrix, matrix) - 2 * (matrix @ np.asarray(vector, dtype=np.float32))
+        top = np.argsort(dist)[:k]
+        return [(float(dist[i]), keys[i]) for i in top]
+
+    def iter_batches(self, batch_size=1000):
+        # Yields (ids, vectors, texts, metadatas); used to copy between backends
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def persist(self):
+        pass
+
+    def compact(self):
+        pass
+
+
+class ChromaIndex(VectorIndex):
+    def __init__(self, path=VECTORSTORE_PATH, embedding=None):
+        from chromadb.api.shared_system_client import SharedSystemClient
+        from langchain_chroma import Chroma
+
+        # chromadb shares one system per path within a process and keeps its vector
+        # segment in memory, so reopening would not see what the ingest worker wrote.
+        # Forget it; an index opened earlier keeps its own system until it is dropped.
+        SharedSystemClient._identifier_to_system.pop(str(path), None)
+        self.store = Chroma(persist_directory=path, embedding_function=embedding)
+
+    def count(self):
+        return self.store._collection.count()
+
+    def add(self, ids, vectors, texts, metadatas):
+        self.store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+    def delete(self, ids):
+        if ids:
+            self.store.delete(ids=ids)
+
+    def search(self, vector, k):
+        return self.store.similarity_search_by_vector(vector, k=k)
+
+    def search_batch(self, vectors, k):
+        results = self.store._collection.query(
+            query_embeddings=[list(map(float, v)) for v in vectors],
+            n_results=k,
+            include=["documents", "metadatas"],
+        )
+        return [
+            [Document(id=i, page_content=t, metadata=m or {}) for i, t, m in zip(ids, texts, metas)]
+            for ids, texts, metas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def get(self, ids):
+        return self.store.get_by_ids(ids)
+
+    def get_vectors(self, ids):
+        found = self.store._collection.get(ids=list(ids), include=["embeddings"])
+        return {i: np.asarray(v, dtype=np.float32) for i, v in zip(found["ids"], found["embeddings"])}
+
+    def search_within(self, vector, ids, k):
+        # Chroma filters by id inside the query instead of returning the embeddings
+        results = self.store._collection.query(
+            query_embeddings=[list(map(float, vector))], ids=list(ids), n_results=k, include=["distances"],
+        )
+        return list(zip(results["distances"][0], results["ids"][0]))
+
+    def iter_batches(self, batch_size=1000):
+        offset = 0
+        while True:
+            batch = self.store._collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            if not batch["ids"]:
+                return
+            yield batch["ids"], np.asarray(batch["embeddings"], dtype=np.float32), batch["documents"], batch["metadatas"]
+            offset += len(batch["ids"])
+
+    def reset(self):
+        self.store.reset_collection()
+
+
+def remove_sqlite(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+class ChunkStore:
+    # Texts and metadata for the in-process backends; `row` is the vector's position/label
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+
+    def _select(self, query, keys):
+        rows = []
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(self._conn.execute(query.format(placeholders), part).fetchall())
+        return rows
+
+    def _insert(self, records):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)", records)
+            self._conn.execute("COMMIT")
+
+    def add(self, rows, ids, texts, metadatas):
+        self._insert([(int(r), i, t, json.dumps(m or {})) for r, i, t, m in zip(rows, ids, texts, metadatas)])
+
+    def rows_for(self, ids):
+        return [row for row, in self._select("SELECT row FROM chunks WHERE id IN ({})", list(ids))]
+
+    def rows_by_id(self, ids):
+        return dict(self._select("SELECT id, row FROM chunks WHERE id IN ({})", list(ids)))
+
+    def by_rows(self, rows):
+        found = self._select("SELECT row, id, text, metadata FROM chunks WHERE row IN ({})", [int(r) for r in rows])
+        return {
+            row: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for row, chunk_id, text, metadata in found
+        }
+
+    def by_ids(self, ids):
+        found = self._select("SELECT id, text, metadata FROM chunks WHERE id IN ({})", list(ids))
+        docs = {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for chunk_id, text, metadata in found
+        }
+        return [docs[i] for i in ids if i in docs]
+
+    def delete_rows(self, rows):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(int(r),) for r in rows])
+
+    def copy_renumbered(self, path, keep):
+        # A new store at `path` where row keep[i] is row i; this one is left as it is
+        remove_sqlite(path)
+        target = ChunkStore(path)
+        for rows in self.iter_batches():
+            new_rows = np.searchsorted(keep, [row for row, _, _, _ in rows])
+            target._insert([(int(new), *rest) for new, (_, *rest) in zip(new_rows, rows)])
+        return target
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def next_row(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def iter_batches(self, batch_size=1000):
+        last_row = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT row, id, text, metadata FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_row = rows[-1][0]
+            yield rows
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+
+
+class FlatIndex(VectorIndex):
+    # Exact search: vectors in a growable memmap, L2 distance via blocked matmul.
+    # Row numbers never change within a generation of files, so another process
+    # (the bot) can keep searching the files it loaded while the ingest worker
+    # adds and deletes. Compaction and reset write a new generation and switch
+    # to it by replacing meta.json; the previous one stays on disk until the next.
+    ROW_FILES = ("vectors.bin", "state.npz", "chunks.sqlite3")
+
+    def __init__(self, path=os.path.join(VECTORSTORE_PATH, "flat"), dtype=FLAT_DTYPE, block_rows=FLAT_BLOCK_ROWS):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self.chunks = None
+        self._load()
+
+    def _file(self, name, generation=None):
+        # Generation 0 keeps the original names, so existing indexes load unchanged
+        generation = self.generation if generation is None else generation
+        if generation:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{generation}{ext}"
+        return os.path.join(self.path, name)
+
+    @property
+    def _vectors_path(self):
+        return self._file("vectors.bin")
+
+    @property
+    def _state_path(self):
+        return self._file("state.npz")
+
+    def _load(self):
+        self.dim = None
+        self.rows = 0
+        self.capacity = 0
+        self.generation = 0
+        self._vectors = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+        self.generation = meta.get("generation", 0)
+        self._open_chunks()
+        if not meta.get("dim"):
+            return
+        if meta["dtype"] != self.dtype.name:
+            raise ValueError(f"Flat index at {self.path} is {meta['dtype']}, config asks for {self.dtype.name}")
+
+        self.dim = meta["dim"]
+        self.rows = meta["rows"]
+        self.capacity = meta["capacity"]
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+        state = np.load(self._state_path)
+        self._norms = np.zeros(self.capacity, dtype=np.float32)
+        self._alive = np.zeros(self.capacity, dtype=bool)
+        # The state file can be a few rows ahead of meta.json while a writer persists
+        self._norms[:self.rows] = state["norms"][:self.rows]
+        self._alive[:self.rows] = state["alive"][:self.rows]
+
+    def _open_chunks(self, chunks=None):
+        if self.chunks is not None:
+            self.chunks.close()
+        self.chunks = chunks or ChunkStore(self._file("chunks.sqlite3"))
+
+    def _ensure_capacity(self, needed, dim):
+        if self._vectors is None:
+            self.dim = dim
+            self.capacity = max(1024, needed)
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="w+", shape=(self.capacity, dim))
+            self._norms = np.zeros(self.capacity, dtype=np.float32)
+            self._alive = np.zeros(self.capacity, dtype=bool)
+            return
+
+        if needed <= self.capacity:
+            return
+
+        capacity = max(needed, self.capacity * 2)
+        self._vectors.flush()
+        self._vectors = None
+        with open(self._vectors_path, "r+b") as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self._norms = np.concatenate([self._norms, np.zeros(capacity - self.capacity, dtype=np.float32)])
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - self.capacity, dtype=bool)])
+        self.capacity = capacity
+
+    def count(self):
+        return int(self._alive[:self.rows].sum())
+
+    def add(self, ids, vectors, texts, metadatas):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._delete_rows(self.chunks.rows_for(ids))
+            start, n = self.rows, len(ids)
+            self._ensure_capacity(start + n, vectors.shape[1])
+
+            self._vectors[start:start + n] = vectors.astype(self.dtype)
+            stored = np.asarray(self._vectors[start:start + n], dtype=np.float32)
+            self._norms[start:start + n] = np.einsum("ij,ij->i", stored, stored)
+            self._alive[start:start + n] = True
+            self.rows += n
+            self.chunks.add(range(start, start + n), ids, texts, metadatas)
+            self._added(start, start + n)
+
+    def _added(self, start, end):
+        # Called under the lock once rows [start, end) are written
+        pass
+
+    def _delete_rows(self, rows):
+        if rows:
+            self._alive[rows] = False
+            self.chunks.delete_rows(rows)
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete_rows(self.chunks.rows_for(ids))
+
+    def search_batch(self, vectors, k):
+        queries = np.asarray(vectors, dtype=np.float32)
+        rows, vectors_view = self.rows, self._vectors
+        if not rows or vectors_view is None:
+            return [[] for _ in queries]
+
+        best_dist = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        # ||x - q||^2 without the constant ||q||^2, one block of rows at a time
+        for start in range(0, rows, self.block_rows):
+            end = min(start + self.block_rows, rows)
+            block = np.asarray(vectors_view[start:end], dtype=np.float32)
+            dist = self._norms[start:end][None, :] - 2 * (queries @ block.T)
+            dist[:, ~self._alive[start:end]] = np.inf
+
+            dist = np.concatenate([best_dist, dist], axis=1)
+            cand = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            keep = min(k, dist.shape[1])
+            top = np.argpartition(dist, keep - 1, axis=1)[:, :keep]
+            best_dist = np.take_along_axis(dist, top, axis=1)
+            best_rows = np.take_along_axis(cand, top, axis=1)
+
+        order = np.argsort(best_dist, axis=1)
+        best_dist = np.take_along_axis(best_dist, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        hits = [
+            [int(r) for r, d in zip(row_ids, dists) if np.isfinite(d)]
+            for row_ids, dists in zip(best_rows, best_dist)
+        ]
+        docs = self.chunks.by_rows(sorted({r for row_hits in hits for r in row_hits}))
+        return [[docs[r] for r in row_hits if r in docs] for row_hits in hits]
+
+    def get(self, ids):
+        return self.chunks.by_ids(ids)
+
+    def get_vectors(self, ids):
+        rows = self.chunks.rows_by_id(ids)
+        vectors = np.asarray(self._vectors[list(rows.values())], dtype=np.float32) if rows else []
+        return dict(zip(rows, vectors))
+
+    def search_within(self, vector, ids, k):
+        # Scores the rows in place with the stored norms, like search_batch()
+        rows = self.chunks.rows_by_id(ids)
+        if not rows:
+            return []
+        keys = list(rows)
+        positions = np.fromiter(rows.values(), dtype=np.int64, count=len(rows))
+        block = np.asarray(self._vectors[positions], dtype=np.float32)
+        dist = self._norms[positions] - 2 * (block @ np.asarray(vector, dtype=np.float32))
+        top = np.argsort(dist)[:k]
+        return [(float(dist[i]), keys[i]) for i in top]
+
+    def iter_batches(self, batch_size=1000):
+        for rows in self.chunks.iter_batches(batch_size):
+            positions = [r for r, _, _, _ in rows]
+            yield (
+                [chunk_id for _, chunk_id, _, _ in rows],
+                np.asarray(self._vectors[positions], dtype=np.float32),
+                [text for _, _, text, _ in rows],
+                [json.loads(metadata) for _, _, _, metadata in rows],
+            )
+
+    def persist(self):
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            tmp_state = f"{self._state_path}.tmp.npz"
+            np.savez(tmp_state, norms=self._norms[:self.rows], alive=self._alive[:self.rows])
+            os.replace(tmp_state, self._state_path)
+            self._persist_extra()
+            # Last: a reader that sees this meta.json finds every file it names
+            self._write_meta()
+
+    def _persist_extra(self):
+        # Called under the lock before meta.json is written
+        pass
+
+    def _write_meta(self):
+        tmp_meta = f"{self._meta_path}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({
+                "dim": self.dim, "rows": self.rows, "capacity": self.capacity, "dtype": self.dtype.name,
+                "generation": self.generation,
+            }, f)
+        os.replace(tmp_meta, self._meta_path)
+
+    def _remove_generation(self, generation):
+        if generation < 0:
+            return
+        for name in self.ROW_FILES:
+            path = self._file(name, generation)
+            if name.endswith(".sqlite3"):
+                remove_sqlite(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def compact(self):
+        with self._lock:
+            dead = self.rows - int(self._alive[:self.rows].sum())
+            if not dead or dead <= COMPACT_RATIO * self.rows:
+                return
+
+            keep = np.flatnonzero(self._alive[:self.rows])
+            capacity = max(1024, len(keep))
+            generation = self.generation + 1
+            self._remove_generation(generation)
+            vectors = np.memmap(self._file("vectors.bin", generation), dtype=self.dtype, mode="w+", shape=(capacity, self.dim))
+            for i in range(0, len(keep), self.block_rows):
+                part = keep[i:i + self.block_rows]
+                vectors[i:i + len(part)] = self._vectors[part]
+            vectors.flush()
+            chunks = self.chunks.copy_renumbered(self._file("chunks.sqlite3", generation), keep)
+
+            self.generation = generation
+            self._vectors = vectors
+            self._open_chunks(chunks)
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[:len(keep)] = self._norms[keep]
+            self._norms = norms
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._alive[:len(keep)] = True
+            self.rows = len(keep)
+            self.capacity = capacity
+            self._compacted(keep)
+        self.persist()
+        # Readers move to the new generation when they reload; the one before stays for them
+        self._remove_generation(self.generation - 2)
+        print(f"Flat index compacted, dropped {dead} deleted rows")
+
+    def _compacted(self, keep):
+        # Called under the lock; row keep[i] is now row i
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.generation += 1
+            self._remove_generation(self.generation)
+            self._vectors = None
+            self._open_chunks()
+            self.dim = None
+            self.rows = 0
+            self.capacity = 0
+            self._norms = np.zeros(0, dtype=np.float32)
+            self._alive = np.zeros(0, dtype=bool)
+            self._reset_extra()
+            self._write_meta()
+        self._remove_generation(self.generation - 2)
+
+    def _reset_extra(self):
+        pass
+
+
+class QuantizedIndex(FlatIndex):
+    # Searches compact codes held in RAM (int8: 1 byte per dimension, PQ: 1 byte
+    # per subvector) and re-scores the best k * rerank candidates against the
+    # float32 vectors, which stay in the on-disk memmap and are only paged in for
+    # those rows. Until `train_size` chunks exist the index searches exactly and
+    # the quantizer is trained on them at that point.
+    ROW_FILES = FlatIndex.ROW_FILES + ("quantizer.npz", "codes.npy")
+
+    def __init__(self, path=os.path.join(VECTORSTORE_PATH, "quantized"), mode=QUANT_MODE,
+                 subvectors=PQ_SUBVECTORS, rerank=QUANT_RERANK, train_size=QUANT_TRAIN_SIZE,
+                 block_rows=QUANT_BLOCK_ROWS):
+        self.mode = mode
+        self.subvectors = subvectors
+        self.rerank = rerank
+        self.train_size = train_size
+        super().__init__(path, dtype="float32", block_rows=block_rows)
+
+    @property
+    def _quantizer_path(self):
+        return self._file("quantizer.npz")
+
+    @property
+    def _codes_path(self):
+        return self._file("codes.npy")
+
+    def _reset_extra(self):
+        self.quantizer = None
+        self._codes = None
+
+    def _load(self):
+        super()._load()
+        self.quantizer = None
+        self._codes = None
+        if not os.path.exists(self._quantizer_path):
+            return
+
+        state = dict(np.load(self._quantizer_path))
+        kind = str(state.pop("kind"))
+        quantizer = create_quantizer(kind, self.subvectors)
+        quantizer.load_state(state)
+        if kind != self.mode or (kind == "pq" and quantizer.subvectors != self.subvectors):
+            # Settings changed since the codes were written; retrain from the stored vectors
+            print(f"Quantized index was built with {kind}, retraining for {self.mode}")
+            self._train()
+            return
+
+        self.quantizer = quantizer
+        self._codes = np.zeros((self.capacity, quantizer.code_size), dtype=np.uint8)
+        self._codes[:self.rows] = np.load(self._codes_path)[:self.rows]
+
+    def _train(self):
+        alive = np.flatnonzero(self._alive[:self.rows])
+        if len(alive) < self.train_size:
+            return
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(alive, size=min(len(alive), QUANT_TRAIN_SAMPLE), replace=False))
+        quantizer = create_quantizer(self.mode, self.subvectors)
+        quantizer.train(np.asarray(self._vectors[sample], dtype=np.float32))
+
+        self._codes = np.zeros((self.capacity, quantizer.code_size), dtype=np.uint8)
+        self._codes[:self.rows] = encode_blocks(quantizer, self._vectors, 0, self.rows)
+        self.quantizer = quantizer
+        print(f"Trained {self.mode} quantizer on {len(sample)} vectors")
+
+    def _added(self, start, end):
+        if self.quantizer is None:
+            self._train()
+            return
+        if len(self._codes) < self.capacity:
+            codes = np.zeros((self.capacity, self.quantizer.code_size), dtype=np.uint8)
+            codes[:len(self._codes)] = self._codes
+            self._codes = codes
+        self._codes[start:end] = encode_blocks(self.quantizer, self._vectors, start, end)
+
+    def _compacted(self, keep):
+        if self._codes is not None:
+            codes = np.zeros((self.capacity, self._codes.shape[1]), dtype=np.uint8)
+            codes[:len(keep)] = self._codes[keep]
+            self._codes = codes
+
+    def bytes_per_chunk(self):
+        # Resident bytes per chunk: codes (or float32 vectors before training), norm, alive flag
+        if self.quantizer is None:
+            return (self.dim or 0) * 4 + 5
+        return self.quantizer.code_size + 5
+
+    def search_batch(self, vectors, k):
+        quantizer, codes, rows = self.quantizer, self._codes, self.rows
+        if quantizer is None:
+            return super().search_batch(vectors, k)
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        candidates = k * self.rerank if self.rerank else k
+        best_dist = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, rows, self.block_rows):
+            end = min(start + self.block_rows, rows)
+            dist = quantizer.distances(queries, codes[start:end], self._norms[start:end])
+            dist[:, ~self._alive[start:end]] = np.inf
+
+            dist = np.concatenate([best_dist, dist], axis=1)
+            cand = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            keep = min(candidates, dist.shape[1])
+            top = np.argpartition(dist, keep - 1, axis=1)[:, :keep]
+            best_dist = np.take_along_axis(dist, top, axis=1)
+            best_rows = np.take_along_axis(cand, top, axis=1)
+
+        hits = []
+        for query, row_ids, dists in zip(queries, best_rows, best_dist):
+            row_ids = np.sort(row_ids[np.isfinite(dists)])
+            if self.rerank and len(row_ids):
+                # Exact distances from the full-precision vectors of the candidates only
+                full = np.asarray(self._vectors[row_ids], dtype=np.float32)
+                dists = self._norms[row_ids] - 2 * (full @ query)
+            else:
+                dists = quantizer.distances(query[None, :], codes[row_ids], self._norms[row_ids])[0]
+            hits.append([int(r) for r in row_ids[np.argsort(dists)[:k]]])
+
+        docs = self.chunks.by_rows(sorted({r for row_hits in hits for r in row_hits}))
+        return [[docs[r] for r in row_hits if r in docs] for row_hits in hits]
+
+    def _persist_extra(self):
+        if self.quantizer is not None:
+            tmp_codes = f"{self._codes_path}.tmp.npy"
+            np.save(tmp_codes, self._codes[:self.rows])
+            os.replace(tmp_codes, self._codes_path)
+            tmp_state = f"{self._quantizer_path}.tmp.npz"
+            np.savez(tmp_state, kind=self.quantizer.kind, **self.quantizer.state())
+            os.replace(tmp_state, self._quantizer_path)
+
+
+class HNSWIndex(VectorIndex):
+    def __init__(self, path=os.path.join(VECTORSTORE_PATH, "hnsw"), m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                 ef_search=HNSW_EF_SEARCH):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("VECTOR_BACKEND=hnsw needs the hnswlib package (pip install hnswlib)")
+
+        self._hnswlib = hnswlib
+        self.path = path
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._index_path = os.path.join(path, "hnsw.bin")
+        self.chunks = ChunkStore(os.path.join(path, "chunks.sqlite3"))
+        self._load()
+
+    def _load(self):
+        self._index = None
+        self.dim = None
+        self._next_label = self.chunks.next_row()
+
+        if not os.path.exists(self._meta_path):
+            return
+
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self._index = self._hnswlib.Index(space="l2", dim=self.dim)
+        self._index.load_index(self._index_path, max_elements=meta["max_elements"], allow_replace_deleted=True)
+        self._index.set_ef(self.ef_search)
+
+    def _ensure_capacity(self, needed, dim):
+        if self._index is None:
+            self.dim = dim
+            self._index = self._hnswlib.Index(space="l2", dim=dim)
+            self._index.init_index(
+                max_elements=max(1024, needed), ef_construction=self.ef_construction,
+                M=self.m, allow_replace_deleted=True,
+            )
+            self._index.set_ef(self.ef_search)
+        elif needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+
+    def count(self):
+        return self.chunks.count()
+
+    def add(self, ids, vectors, texts, metadatas):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._delete_rows(self.chunks.rows_for(ids))
+            self._ensure_capacity(self._index.get_current_count() + len(ids) if self._index else len(ids), vectors.shape[1])
+            labels = np.arange(self._next_label, self._next_label + len(ids))
+            self._index.add_items(vectors, labels, replace_deleted=True)
+            self._next_label += len(ids)
+            self.chunks.add(labels, ids, texts, metadatas)
+
+    def _delete_rows(self, rows):
+        # Without hnsw.bin (lost or never persisted) there is nothing to mark
+        if self._index is not None:
+            for row in rows:
+                self._index.mark_deleted(int(row))
+        if rows:
+            self.chunks.delete_rows(rows)
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete_rows(self.chunks.rows_for(ids))
+
+    def search_batch(self, vectors, k):
+        queries = np.asarray(vectors, dtype=np.float32)
+        k = min(k, self.count())
+        if self._index is None or not k:
+            return [[] for _ in queries]
+
+        self._index.set_ef(max(self.ef_search, k))
+        labels, _ = self._index.knn_query(queries, k=k)
+        docs = self.chunks.by_rows(sorted({int(label) for row in labels for label in row}))
+        return [[docs[int(label)] for label in row if int(label) in docs] for row in labels]
+
+    def get(self, ids):
+        return self.chunks.by_ids(ids)
+
+    def get_vectors(self, ids):
+        rows = self.chunks.rows_by_id(ids)
+        vectors = np.asarray(self._index.get_items(list(rows.values())), dtype=np.float32) if rows else []
+        return dict(zip(rows, vectors))
+
+    def iter_batches(self, batch_size=1000):
+        for rows in self.chunks.iter_batches(batch_size):
+            yield (
+                [chunk_id for _, chunk_id, _, _ in rows],
+                np.asarray(self._index.get_items([r for r, _, _, _ in rows]), dtype=np.float32),
+                [text for _, _, text, _ in rows],
+                [json.loads(metadata) for _, _, _, metadata in rows],
+            )
+
+    def persist(self):
+        with self._lock:
+            if self._index is None:
+                return
+            tmp_index = f"{self._index_path}.tmp"
+            self._index.save_index(tmp_index)
+            os.replace(tmp_index, self._index_path)
+            tmp_meta = f"{self._meta_path}.tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump({"dim": self.dim, "max_elements": self._index.get_max_elements()}, f)
+            os.replace(tmp_meta, self._meta_path)
+
+    def reset(self):
+        with self._lock:
+            for path in (self._meta_path, self._index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.chunks.clear()
+        self._load()
+
+
+def create_vector_index(backend=VECTOR_BACKEND, path=None, embedding=None):
+    if backend == "chroma":
+        return ChromaIndex(path or VECTORSTORE_PATH, embedding)
+    if backend == "flat":
+        return FlatIndex(path or os.path.join(VECTORSTORE_PATH, "flat"))
+    if backend == "hnsw":
+        return HNSWIndex(path or os.path.join(VECTORSTORE_PATH, "hnsw"))
+    if backend == "quantized":
+        return QuantizedIndex(path or os.path.join(VECTORSTORE_PATH, "quantized"))
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def copy_index(source, target, batch_size=1000):
+    copied = 0
+    for ids, vectors, texts, metadatas in source.iter_batches(batch_size):
+        target.add(ids, vectors, texts, metadatas)
+        copied += len(ids)
+    target.persist()
+    return copied
+
+
+def sample_queries(index, n_queries, noise=0.05, seed=0):
+    # Perturbed copies of stored vectors stand in for real questions
+    rng = np.random.default_rng(seed)
+    vectors = np.concatenate([v for _, v, _, _ in index.iter_batches()])
+    picked = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    scale = noise * np.linalg.norm(picked, axis=1, keepdims=True) / np.sqrt(picked.shape[1])
+    return picked + rng.normal(size=picked.shape).astype(np.float32) * scale
+
+
+def recall_at_k(reference, candidate, queries, k=6):
+    def timed_search(index):
+        started = time.perf_counter()
+        results = [[d.id for d in index.search(q, k)] for q in queries]
+        return results, 1000 * (time.perf_counter() - started) / len(queries)
+
+    expected, reference_ms = timed_search(reference)
+    found, candidate_ms = timed_search(candidate)
+    recall = np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found) if e])
+    return float(recall), reference_ms, candidate_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index tools")
+    parser.add_argument("command", choices=["recall", "migrate"])
+    parser.add_argument("--backend", default=VECTOR_BACKEND, choices=["flat", "hnsw", "quantized"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=6)
+    args = parser.parse_args()
+
+    chroma = ChromaIndex()
+
+    if args.command == "migrate":
+        # Copies vectors (no re-embedding) and the manifest into the configured backend dir
+        target = create_vector_index(args.backend)
+        target.reset()
+        print(f"Copied {copy_index(chroma, target)} chunks to {args.backend}")
+        manifest = os.path.join(VECTORSTORE_PATH, "manifest.json")
+        if os.path.exists(manifest):
+            shutil.copy(manifest, os.path.join(VECTORSTORE_PATH, args.backend, "manifest.json"))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            candidate = create_vector_index(args.backend, path=tmp_dir)
+            copy_index(chroma, candidate)
+            queries = sample_queries(chroma, args.queries)
+            recall, chroma_ms, candidate_ms = recall_at_k(chroma, candidate, queries, args.k)
+            print(
+                f"{args.backend}: recall@{args.k} {recall:.3f} vs chroma | "
+                f"{candidate_ms:.2f} ms/query ({chroma_ms:.2f} ms chroma), {chroma.count()} chunks"
+            )